@@ -0,0 +1,174 @@
+#Benchmark for The Quest for the Golden Coins
+#Runs scripted inputs through each level without a window and reports the speed of each part of a frame
+#Usage: python benchmark.py [frames per level] [seed]
+
+import sys #Include the sys module
+import tracemalloc #Include the memory allocation tracer
+from time import perf_counter #Include the high resolution timer
+import pygame #Include the pygame module
+import project
+
+#Frames to run per level, and seed for the random numbers
+FRAMES = 1800
+SEED   = 2016
+
+
+#-------------------------------------------------------------------------------
+#Returns the scripted key presses for a frame: run right, jump and shoot at fixed intervals
+#Parameters: frame number
+def scriptedInputs(frame):
+
+    events = []
+    if (frame == 1):
+        events.append(pygame.event.Event(pygame.KEYDOWN, key = pygame.K_RIGHT))
+    if (frame % 40 == 0):
+        events.append(pygame.event.Event(pygame.KEYDOWN, key = pygame.K_SPACE))
+    if (frame % 90 == 0):
+        events.append(pygame.event.Event(pygame.KEYDOWN, key = pygame.K_d))
+    if (frame % 90 == 5):
+        events.append(pygame.event.Event(pygame.KEYUP, key = pygame.K_d))
+    if (frame == 10):
+        events.append(pygame.event.Event(pygame.KEYDOWN, key = pygame.K_m))
+
+    return events
+
+
+#-------------------------------------------------------------------------------
+#Runs a level for a number of frames and measures it
+#The timed pass runs without allocation tracing (it slows some phases down far more than others),
+#then the same frames are run again to measure memory
+#Parameters: index of the level, number of frames, seed for the random numbers
+#Returns: dictionary of results
+def runLevel(levelNo, frames, seed):
+
+    result = timeLevel(levelNo, frames, seed)
+    result["memory"], result["peakMemory"] = traceLevel(levelNo, frames, seed)
+
+    return result
+
+
+#-------------------------------------------------------------------------------
+#Starts a game on a level
+#Parameters: index of the level, seed for the random numbers
+#Returns: game
+def startGame(levelNo, seed):
+
+    game = project.Game(headless = True, seed = seed)
+    game.startLevel(levelNo)
+
+    return game
+
+
+#-------------------------------------------------------------------------------
+#Runs the scripted inputs for one frame of a game
+#Parameters: game, frame number, dictionary to add the time of each phase of the frame to (optional)
+def playFrame(game, frame, phases = None):
+
+    #Keep the player alive so that every frame plays the level, not the end screen
+    game.player.health = max(game.player.health, 100)
+    game.elapsed = 0.0
+
+    t0 = perf_counter()
+    game.handleEvents(scriptedInputs(frame))
+    t1 = perf_counter()
+    game.updateLogic()
+    t2 = perf_counter()
+    game.render()
+    t3 = perf_counter()
+
+    if (phases is not None):
+        phases["events"] += t1 - t0
+        phases["logic"]  += t2 - t1
+        phases["draw"]   += t3 - t2
+
+
+#-------------------------------------------------------------------------------
+#Runs a level for a number of frames and times each phase of a frame
+#Parameters: index of the level, number of frames, seed for the random numbers
+#Returns: dictionary of results
+def timeLevel(levelNo, frames, seed):
+
+    game = startGame(levelNo, seed)
+
+    #Time spent in each phase of the frame
+    phases = {"events": 0.0, "logic": 0.0, "draw": 0.0}
+
+    #Time the named parts of each frame as well
+    project.PROFILER.enabled = True
+    project.PROFILER.trace.clear()
+
+    start = perf_counter()
+
+    for frame in range(1, frames + 1):
+        project.PROFILER.beginFrame()
+        playFrame(game, frame, phases)
+        project.PROFILER.endFrame(game.spriteCounts())
+
+    total = perf_counter() - start
+    project.PROFILER.enabled = False
+
+    #Add up the time of each profiled part over every frame
+    scopes = {}
+    for record in project.PROFILER.trace:
+        for name in record:
+            if (isinstance(record[name], float) and name != "total"):
+                scopes[name] = scopes.get(name, 0.0) + record[name]
+
+    memory = game.player.currentLevel.memoryReport()
+
+    return {"level": levelNo + 1, "entities": memory, "frames": frames, "fps": frames / total, "phases": phases, "scopes": scopes,
+            "position": game.player.rect.x}
+
+
+#-------------------------------------------------------------------------------
+#Runs a level for a number of frames with allocation tracing on (not timed)
+#Parameters: index of the level, number of frames, seed for the random numbers
+#Returns: memory allocated at the end, and the most allocated at once (in bytes)
+def traceLevel(levelNo, frames, seed):
+
+    game = startGame(levelNo, seed)
+    tracemalloc.start()
+
+    for frame in range(1, frames + 1):
+        playFrame(game, frame)
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return current, peak
+
+
+#-------------------------------------------------------------------------------
+#Prints the results of a level
+#Parameters: dictionary of results
+def report(result):
+
+    print("Level " + str(result["level"]) + ": " + str(result["frames"]) + " frames, " + str(round(result["fps"], 1)) + " frames/sec")
+    for phase in result["phases"]:
+        print("  " + phase.ljust(8) + str(round(result["phases"][phase] * 1000 / result["frames"], 3)).rjust(8) + " ms/frame")
+    for scope in sorted(result["scopes"]):
+        print("    " + scope.ljust(22) + str(round(result["scopes"][scope] * 1000 / result["frames"], 3)).rjust(8) + " ms/frame")
+    print("  allocated " + str(result["memory"] // 1024) + " KiB, peak " + str(result["peakMemory"] // 1024) + " KiB")
+    for kind in result["entities"]:
+        count, each, total = result["entities"][kind]
+        line = "    " + kind.ljust(8) + str(count).rjust(6)
+        if (each is not None):
+            line += " x " + str(each).rjust(5) + " B"
+        print(line.ljust(32) + "= " + str(total).rjust(7) + " B")
+    print("  player reached x = " + str(result["position"]))
+
+
+#Main
+if __name__ == '__main__':
+
+    frames = FRAMES
+    seed   = SEED
+    if (len(sys.argv) > 1):
+        frames = int(sys.argv[1])
+    if (len(sys.argv) > 2):
+        seed = int(sys.argv[2])
+
+    for levelNo in range(2):
+        report(runLevel(levelNo, frames, seed))
+
+    pygame.quit()
@@ -1,7 +1,24 @@
 #Import modules
-from random import randint #Include the randint function from the random module
+from random import Random #Include the random number generator class from the random module
+import os #Include the os module
+from collections import OrderedDict, deque #Include the ordered dictionary and the double-ended queue from the collections module
+from array import array #Include the compact number array from the array module
+import json #Include the json module
+import struct #Include the struct module
+import threading #Include the threading module
+import csv #Include the csv module
+from bisect import bisect_left, bisect_right #Include the sorted list functions from the bisect module
+from time import perf_counter #Include the high resolution timer
+import tracemalloc #Include the memory allocation tracer
+import sys #Include the sys module
 import pygame #Include the pygame module
 
+#NumPy is only needed for the vectorized physics
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 #GLOBAL CONSTANTS
 
 #Define colours
@@ -16,20 +33,164 @@ YELLOW   = (255, 255,   0)
 PEAGREEN = (  0, 153,   0)
 LAVARED  = (255,  50,   0)
 
-#Helper text list
-LOGLST   = ["Welcome to The Quest for the Golden Coins", "Press 1 for help text"]
+#Files that describe the levels, in order
+LEVELFILES = ["levels/level1.json", "levels/level2.json"]
+
+#Width of the chunks a level is split into, and the distance around the screen in which chunks are kept active
+CHUNKWIDTH  = 1024
+CHUNKMARGIN = 512
+
+#Part of a level after which the next level is read in the background
+PREFETCHPOINT = 0.75
+
+#Textures of each platform type
+PLATFORMTEXTURES = {"platform": "images/grassPlat.png", "ground": "images/grassGround.png"}
+
+#Animations: sprite sheet (frames side by side), number of frames, seconds each frame is shown, colour to make transparent
+ANIMATIONS = {"playerIdle": ("images/player/defaultImage.png", 1, 0.25, WHITE),
+              "playerWalk": ("images/player/walkSheet.png",    2, 0.25, None),
+              "enemyIdle":  ("images/enemy.png",               1, 0.25, WHITE)}
+
+#Sound effects, their volume and the most copies of each that can play at once
+SOUNDFILES   = {"coin": "sounds/coin.ogg", "jump": "sounds/jump.ogg", "shoot": "sounds/shoot.ogg"}
+SOUNDVOLUMES = {"coin": 0.05}
+SOUNDVOICES  = {"coin": 2, "jump": 1, "shoot": 2}
+
+#Background music (streamed from disk, not loaded into memory) and its volume
+MUSICFILE   = "sounds/bgMusic.ogg"
+MUSICVOLUME = 0.25
+
+#Commands run when a key is pressed or released (methods of Game, change these to remap the controls)
+KEYBINDINGS = {pygame.K_1: "showHelp", pygame.K_3: "toggleCoinSound", pygame.K_SPACE: "jump", pygame.K_a: "shootLeft", pygame.K_d: "shootRight",
+               pygame.K_n: "toggleHud", pygame.K_m: "toggleLog", pygame.K_F3: "toggleOverlay", pygame.K_F4: "saveTrace"}
+RELEASEBINDINGS = {}
+
+#Keys that move the player while they are held, and the speed they give (bind a key to a speed to remap them)
+MOVEKEYS = {pygame.K_LEFT: -6, pygame.K_RIGHT: 6}
+
+#Only update the parts of the screen that changed (False updates the whole screen every frame)
+DIRTYRECTS = True
+
+#Time limit of the game in seconds
+TIMELIMIT = 180
+
+#The game is updated SIMRATE times per second of game time (physics, timers and animations count updates)
+SIMRATE = 60
+SIMSTEP = 1.0 / SIMRATE
+
+#Most updates to run before a frame is drawn when the game falls behind, and the highest frame rate
+MAXSTEPS = 5
+FPSLIMIT = 60
+
+#Draw moving sprites between their last two positions (smoother when frames and updates don't line up)
+INTERPOLATE = False
+
+#Keep the state of enemies and bullets in the component columns of an entity store, the sprites being facades over
+#their rows (needs numpy, without it every sprite keeps its own state)
+VECTORPHYSICS = True
+
+#An entity store with fewer rows than this updates them one sprite at a time (a NumPy call costs more than
+#a few dozen sprites, so the columns are only moved all at once in crowded levels)
+VECTORROWS = 64
+
+#Colour of the bullets of each side, and the sprite list of the level they are added to
+FACTIONS = {"player": (PEAGREEN, "playerBullets"), "enemy": (RED, "enemyBullets")}
+
+#Enemies shoot every SHOOTINTERVAL frames
+SHOOTINTERVAL = 30
+
+#Distance from the screen at which bullets are removed
+BULLETMARGIN = 500
+
+#Random number generator (seeded by the game to make runs repeatable)
+RNG = Random()
+
+#Box of the performance overlay, and the file profiled frames are saved to
+PROFILERBOX = (0, 618, 420, 150)
+TRACEFILE   = "profile_trace.csv"
+
+#Number of lines that fit in the helper text box
+LOGLINES = 10
+
+
+#-------------------------------------------------------------------------------
+#pygame's Sprite keeps the sprite lists it is in as a set in its dictionary (named _Sprite__g, as of pygame 2.6)
+#This is not part of pygame's documented interface, so it is checked before it is relied on
+COMPACTSPRITES = "_Sprite__g" in getattr(pygame.sprite.Sprite(), "__dict__", {})
+
+#Sprite that keeps its attributes in slots, for entities there can be many of (coins, enemies, bullets)
+if (COMPACTSPRITES):
+    class CompactSprite(pygame.sprite.Sprite):
+        #ATTRIBUTES (a list is much smaller than a set for the few sprite lists a sprite is in)
+        __slots__ = ("_Sprite__g",)
+        
+        #Constructor Method
+        def __init__(self):
+            
+            super(CompactSprite, self).__init__()
+            self._Sprite__g = []
+        
+        #Adds a sprite list the sprite is in (called by pygame)
+        #Parameters: sprite list
+        def add_internal(self, group):
+            self._Sprite__g.append(group)
+        
+        #Removes a sprite list the sprite is in (called by pygame)
+        #Parameters: sprite list
+        def remove_internal(self, group):
+            self._Sprite__g.remove(group)
+
+#A pygame that keeps the sprite lists some other way gets a plain Sprite (bigger, but nothing depends on pygame's internals)
+else:
+    class CompactSprite(pygame.sprite.Sprite):
+        #ATTRIBUTES
+        __slots__ = ()
+
+
+#-------------------------------------------------------------------------------
+#Attribute of a sprite that is kept in a column of the entity store the sprite is in, and in a slot of the sprite otherwise
+class Component(object):
+    #ATTRIBUTES
+    column = None
+    slot   = None
+    
+    #Constructor Method
+    #Parameters: name of the column, slot descriptor the value is kept in outside a store
+    def __init__(self, column, slot):
+        
+        self.column = column
+        self.slot   = slot
+    
+    #Returns the value for a sprite (called by Python)
+    #Parameters: sprite, its class
+    def __get__(self, sprite, owner = None):
+        
+        if (sprite is None):
+            return self
+        store = sprite.store
+        if (store is None):
+            return self.slot.__get__(sprite, owner)
+        return store.__dict__[self.column][sprite.row].item()
+    
+    #Sets the value for a sprite (called by Python)
+    #Parameters: sprite, value
+    def __set__(self, sprite, value):
+        
+        store = sprite.store
+        if (store is None):
+            self.slot.__set__(sprite, value)
+        else:
+            store.__dict__[self.column][sprite.row] = value
 
 
 #-------------------------------------------------------------------------------
 #Abstract class for a moving sprite
-class MovingSprite(pygame.sprite.Sprite):
+class MovingSprite(CompactSprite):
     
-    #ATTRIBUTES
-    currentLevel = None
-    velocityX    = None
-    velocityY    = None
-    ammo         = None
-    currentFrame = None
+    #ATTRIBUTES (kept in slots instead of a dictionary for each sprite, prevPos is only set while interpolating,
+    #store and row are the entity store the sprite is in and its row there, clip is the animation that is playing)
+    __slots__ = ("image", "rect", "currentLevel", "velocityX", "velocityY", "ammo", "health", "currentFrame", "faction", "prevPos",
+                 "store", "row", "clip", "clipTime", "facing")
     
     #Constructor Method
     def __init__(self):
@@ -37,12 +198,21 @@ class MovingSprite(pygame.sprite.Sprite):
         #Call the parent constructor from sprite library
         super(MovingSprite, self).__init__()
         
+        #Not in an entity store yet
+        self.store = None
+        self.row   = None
+        
+        #The level is set once the sprite is put in one, the side by the subclass
+        self.currentLevel = None
+        self.faction      = None
+        
         #Sets the surface of sprite
         self.image = pygame.Surface([30, 60])
         self.image.set_colorkey(WHITE)
         
-        #Sets default ammo of sprite
-        self.ammo = 0
+        #Sets default ammo and health of sprite
+        self.ammo   = 0
+        self.health = 1
         
         #Set speed to 0 for both horizontal and vertical movement
         self.velocityX = 0
@@ -51,6 +221,11 @@ class MovingSprite(pygame.sprite.Sprite):
         #Track the current frame for animation purposes
         self.currentFrame = 0
         
+        #No animation until the subclass plays one, facing right
+        self.clip     = None
+        self.clipTime = 0.0
+        self.facing   = 1
+        
         #Create a rect to set the location of the sprite
         self.rect = self.image.get_rect()
     
@@ -64,7 +239,7 @@ class MovingSprite(pygame.sprite.Sprite):
         self.rect.x += self.velocityX
             
         #Count the platforms that the sprite collided with when moving left/right
-        collisionList = pygame.sprite.spritecollide(self, self.currentLevel.platforms, False)
+        collisionList = self.currentLevel.platformGrid.collide(self.rect)
         
         #Iterate through the platforms
         for item in collisionList:
@@ -79,7 +254,7 @@ class MovingSprite(pygame.sprite.Sprite):
         self.rect.y += self.velocityY
         
         #Count the platforms that the player collided with when moving up/down
-        collisionList = pygame.sprite.spritecollide(self, self.currentLevel.platforms, False)
+        collisionList = self.currentLevel.platformGrid.collide(self.rect)
         
         #Iterate through the platforms
         for item in collisionList:
@@ -101,7 +276,7 @@ class MovingSprite(pygame.sprite.Sprite):
         self.rect.y += 2
         
         #Make a collision list to check if sprite collides with platform when moved down
-        collisionList = pygame.sprite.spritecollide(self, self.currentLevel.platforms, False)
+        collisionList = self.currentLevel.platformGrid.collide(self.rect)
         
         #Reset y position of sprite to original value
         self.rect.y -= 2
@@ -111,6 +286,22 @@ class MovingSprite(pygame.sprite.Sprite):
         if (len(collisionList) > 0 or self.rect.y > 717):
             self.velocityY = -10
     
+    #Starts an animation from its first frame (keeps going if it is already playing)
+    #Parameters: animation clip
+    def play(self, clip):
+        
+        if (clip is not self.clip):
+            self.clip     = clip
+            self.clipTime = 0.0
+            self.image    = clip.frame(0.0, self.facing)
+    
+    #Moves the animation on and shows the frame for the time that has passed
+    #Parameters: seconds since the last call
+    def animate(self, seconds):
+        
+        self.clipTime += seconds
+        self.image     = self.clip.frame(self.clipTime, self.facing)
+    
     #Moves the sprite left/right
     #Parameter: x velocity of sprite
     def move(self, change):
@@ -126,16 +317,14 @@ class MovingSprite(pygame.sprite.Sprite):
             #Subtract 1 from ammo and create a bullet
             self.ammo -= 1
             
-            #Check if it's an enemy or player bullet being fired
-            if (self in self.currentLevel.enemies):
-                bullet = Bullet(self, bulletVelocity, RED)
-                self.currentLevel.enemyBullets.add(bullet)
-            else:
-                bullet = Bullet(self, bulletVelocity, PEAGREEN)
-                self.currentLevel.playerBullets.add(bullet)
+            #The side the sprite is on decides the colour of the bullet and who it can hit
+            colour, bulletList = FACTIONS[self.faction]
+            bullet = BULLETS.acquire(self, bulletVelocity, colour)
+            getattr(self.currentLevel, bulletList).add(bullet)
                 
-            #Add this bullet to the current level's all sprites list, so that it can be updated
+            #Add this bullet to the current level's all sprites list, and to the moving sprites so that it is updated
             self.currentLevel.allSprites.add(bullet)
+            self.currentLevel.dynamicSprites.add(bullet)
             
              
 #-------------------------------------------------------------------------------
@@ -143,34 +332,26 @@ class MovingSprite(pygame.sprite.Sprite):
 class Player(MovingSprite):
     
     #ATTRIBUTES
-    health      = None
-    score       = None
-    coins       = None
-    playerImage = None
-    indexWalk   = None
-    walkImages  = None
+    __slots__ = ("score", "coins", "idleClip", "walkClip")
 
     #Constructor method
     def __init__(self):
         #Call the parent MovingSprite Constructor
         super(Player, self).__init__()
         
+        #The player's bullets hit enemies
+        self.faction = "player"
+        
         #Set the start position of the player
         self.rect.x = 150
         self.rect.y = 150
 
-        #Load player images
-        self.playerImage = importImage("images/player/defaultImage.png")
-        self.walkImages  = [importImage("images/player/walkingImage1.png"), importImage("images/player/walkingImage2.png")]
-        #self.walkImages.append(importImage("images/player/walkingImage1.png"))
-        #self.walkImages.append(importImage("images/player/walkingImage2.png"))
+        #Get the player's animations (shared, the frames are only cut from the sheets once)
+        self.idleClip = ASSETS.clip("playerIdle")
+        self.walkClip = ASSETS.clip("playerWalk")
 
         #Set the player's image
-        self.image = self.playerImage
-        self.image.set_colorkey(WHITE)
-
-        #Set the initial walk image
-        self.indexWalk = 0
+        self.play(self.idleClip)
         
         #Override default ammo of moving sprite class and set defualt ammo of player
         self.ammo = 20
@@ -180,28 +361,30 @@ class Player(MovingSprite):
         self.health = 100
         self.coins  =   0
     
-    #Animates the player's walk     
-    def walk(self):
+    #Animates the player's walk, facing the way the player moves
+    #Parameters: seconds since the last call
+    def walk(self, seconds):
 
-        #If 15 frames have passed, change walk image
         if (self.velocityX != 0):
-            self.image = self.walkImages[self.indexWalk]
-
-            #If all images have been run through change the image back to the 1st
-            if (self.indexWalk == 1):
-                self.indexWalk = 0
-            else:
-                self.indexWalk += 1
+            self.facing = 1 if self.velocityX > 0 else -1
+            self.play(self.walkClip)
+        else:
+            self.play(self.idleClip)
+        
+        self.animate(seconds)
                
                 
 #-------------------------------------------------------------------------------
 #Template for an enemy
 class Enemy(MovingSprite):
-    #ATTRUBUTES
-    jumpTime = None
-    orgPos = None
+    #ATTRUBUTES (indexX is the x position the AI scheduler has the enemy under)
+    __slots__ = ("jumpTime", "orgPos", "indexX")
     
-    def __init__(self, pos):
+    #Attributes kept in the columns of the entity store the enemy is in
+    COMPONENTS = ("velocityX", "velocityY", "currentFrame", "ammo", "health", "facing")
+    
+    #Parameters: position of enemy, interval between jumps (random if not given)
+    def __init__(self, pos, jumpTime = None):
         
         #Call the parent MovingSprite Constructor
         super(Enemy, self).__init__()
@@ -210,16 +393,19 @@ class Enemy(MovingSprite):
         self.rect.x = pos[0]
         self.rect.y = pos[1]
         self.orgPos = pos
+        self.indexX = None
         
-        #Set the image of the enemy
-        self.image = importImage("images/enemy.png")
-        self.image.set_colorkey(WHITE)        
+        #Set the animation of the enemy, and make its bullets hit the player
+        self.play(ASSETS.clip("enemyIdle"))
+        self.faction = "enemy"
         
         #Give the enemy almost unlimited ammo (override default ammo)
         self.ammo = 2e64
         
         #Set the interval between jumps to random
-        self.jumpTime = randint(45, 120)
+        if (jumpTime is None):
+            jumpTime = RNG.randint(45, 120)
+        self.jumpTime = jumpTime
     
     #Shoots the player (Overrided method)
     #Parameter: target to shoot (player)
@@ -230,6 +416,11 @@ class Enemy(MovingSprite):
             bulletVelocity = -15
         else:
             bulletVelocity = 15
+        
+        #Turn to face the target (only changes the image when the enemy turns around)
+        if (self.facing * bulletVelocity < 0):
+            self.facing = -self.facing
+            self.image  = self.clip.frame(self.clipTime, self.facing)
             
         #Only shoot if the player is near the enemy
         if (abs(target.rect.x - self.rect.x) < 500 and abs(target.rect.y - self.rect.y) < 50):
@@ -243,6 +434,10 @@ class Enemy(MovingSprite):
         #Only jump if the player is near
         if (abs(player.rect.x - self.rect.x) < 700 and abs(player.rect.y - self.rect.y) < 400):
             super(Enemy, self).jump()
+
+#An enemy in an entity store is a facade over its row
+for name in Enemy.COMPONENTS:
+    setattr(Enemy, name, Component(name, getattr(MovingSprite, name)))
             
 
 #-------------------------------------------------------------------------------
@@ -255,21 +450,18 @@ class Platform(pygame.sprite.Sprite):
         
         super(Platform, self).__init__()
         
-        #Set the dimensions of the plaform
-        self.image = pygame.Surface(dimensions)
+        #Set the image of platform depending on type
+        #Grass platforms are views into one shared texture instead of copies of it
+        if (imageType in PLATFORMTEXTURES):
+            self.image = platformImage(PLATFORMTEXTURES[imageType], dimensions)
+        else:
+            self.image = pygame.Surface(dimensions)
+            self.image.fill(BROWN)
         
         #Set the position of the platform
         self.rect   = self.image.get_rect()
         self.rect.x = pos[0]
         self.rect.y = pos[1]
-        
-        #Set the image of platform depending on type
-        if (imageType == "platform"):
-            self.image.blit(importImage("images/grassPlat.png"), [0,0])
-        elif (imageType == "ground"):
-            self.image.blit(importImage("images/grassGround.png"), [0,0])
-        else:
-            self.image.fill(BROWN)
 
         
 #-------------------------------------------------------------------------------
@@ -300,16 +492,25 @@ class Obstacle(pygame.sprite.Sprite):
 #Class for a level
 class Level(object):
     #ATTRIBUTES
-    platforms     = None
-    coins         = None
-    enemies       = None
-    obstacles     = None
-    allSprites    = None
-    worldShift    = None
-    maxWorldShift = None
-    playerBullets = None
-    enemyBullets  = None
-    textList      = None
+    platforms      = None
+    coins          = None
+    enemies        = None
+    obstacles      = None
+    allSprites     = None
+    dynamicSprites = None
+    background     = None
+    alpha          = None
+    camera         = None
+    maxWorldShift  = None
+    playerBullets  = None
+    enemyBullets   = None
+    textList       = None
+    platformGrid   = None
+    obstacleGrid   = None
+    chunks         = None
+    activeChunks   = None
+    staticRefs     = None
+    ai             = None
     #images       = None
     #backgroundImg = None
     
@@ -320,47 +521,71 @@ class Level(object):
         self.collisionObjects = pygame.sprite.Group()
         self.enemies          = pygame.sprite.Group()
         self.allSprites       = pygame.sprite.Group()
+        self.dynamicSprites   = pygame.sprite.Group() #Sprites that move (enemies and bullets)
+        if (VECTORPHYSICS and numpy is not None):
+            self.dynamicSprites = EntityStore(self) #Same sprites, their state kept in component columns
+        
+        #Platforms and obstacles drawn once into cached tiles
+        self.background = BackgroundLayer(self)
         self.platforms        = pygame.sprite.Group()
         self.coins            = pygame.sprite.Group()
         self.playerBullets    = pygame.sprite.Group()
         self.enemyBullets     = pygame.sprite.Group()
         self.obstacles        = pygame.sprite.Group()
         
+        #Spatial indexes of the static platforms and obstacles for collision queries
+        self.platformGrid = SpatialGrid()
+        self.obstacleGrid = SpatialGrid()
+        
+        #How far rendering is between the last two updates (1 draws the newest positions)
+        self.alpha = 1.0
+        
         #Control the world shift
-        self.worldShift = 0 #This controls how much to shift the world
+        self.camera = Camera() #Sprites keep their world position, the camera controls how much to shift the world
         self.maxWorldShift = 1000 # This is the world shift necessary for the level to end
         
         self.textList = []
         #self.images = []
+        
+        #The level is split into chunks, only the chunks near the camera have live sprites
+        self.chunks       = {}
+        self.activeChunks = set()
+        
+        #Number of active chunks each platform and obstacle is in
+        self.staticRefs = {}
+        
+        #Wakes the live enemies when they can jump or shoot
+        self.ai = AIScheduler(self)
      
     #Method to generate the platforms and enemies
     #Parameters: 2D list of platform info, 2D list of enemy positions, 2D list of coin positions, list of text box positions
     def generateLevel(self, platforms, enemies, coins, text, obstacles = []):
         
+        #Crop each platform texture once to the biggest platform that shows it, before the platforms take views into it
+        extents = {}
+        for plat in platforms:
+            if (plat[4] in PLATFORMTEXTURES):
+                width, height = extents.get(plat[4], (0, 0))
+                extents[plat[4]] = (max(width, plat[2]), max(height, plat[3]))
+        for imageType in extents:
+            ASSETS.texture(PLATFORMTEXTURES[imageType], extents[imageType])
+        
         #Iterate through the supplied platform information and create Platform objects
         for plat in platforms:
             platform = Platform([plat[0], plat[1]], [plat[2], plat[3]], plat[4])
             
-            #Add the created platforms to the respective sprite lists
-            self.platforms.add(platform)
-            self.allSprites.add(platform)
+            #Add the created platforms to the collision index and to every chunk they reach into
+            self.platformGrid.add(platform)
+            for chunk in self.chunksOf(platform.rect):
+                chunk.platforms.append(platform)
             
-        #Iterate through the supplied coin positions and create Coin objects
+        #Coins are kept as positions until their chunk is activated
         for coinPos in coins:
-            coin = Coin(coinPos)
-            
-            #Add the created coin to the respective sprite lists
-            self.coins.add(coin)
-            self.allSprites.add(coin)
+            self.chunkAt(coinPos[0]).coins.append((coinPos[0], coinPos[1]))
         
-        #Iterate through the supplied enemy position and create Enemy objects
+        #Enemies are kept as [x, y, interval between jumps] until their chunk is activated
         for enem in enemies:
-            enemy = Enemy([enem[0], enem[1]])
-            enemy.currentLevel = self
-            
-            #Add the created enemy to the respective sprite lists
-            self.enemies.add(enemy)
-            self.allSprites.add(enemy)
+            self.chunkAt(enem[0]).enemies.append((enem[0], enem[1], RNG.randint(45, 120)))
 
         #Iterate throught the supplied text box information and create text boxes
         for texts in text:
@@ -369,57 +594,433 @@ class Level(object):
         #Iterate through the supplied image information and create images
         for obs in obstacles:
             obstacle = Obstacle([obs[0], obs[1]], [obs[2], obs[3]], obs[4])
-            self.obstacles.add(obstacle)
-            self.allSprites.add(obstacle)
+            self.obstacleGrid.add(obstacle)
+            for chunk in self.chunksOf(obstacle.rect):
+                chunk.obstacles.append(obstacle)
+        
+        #Activate the chunks that the camera can see
+        self.updateChunks()
     
-    #Shifts the level (called when player approches right side of screen)
-    #Parameters: Value to shift level
-    def scroll(self, value):
+    #Returns the chunk at an x position in the world, creating it if needed
+    #Parameters: x position
+    def chunkAt(self, x):
         
-        #Keep track of how much the level has been shifted
-        self.worldShift += value
+        index = x // CHUNKWIDTH
+        if (index not in self.chunks):
+            self.chunks[index] = Chunk()
         
-        #Shift all the platforms
-        for sprite in self.platforms:
-            sprite.rect.x += value
+        return self.chunks[index]
+    
+    #Returns every chunk a rect reaches into
+    #Parameters: rect in the world
+    def chunksOf(self, rect):
+        return [self.chunkAt(index * CHUNKWIDTH) for index in range(rect.left // CHUNKWIDTH, (rect.right - 1) // CHUNKWIDTH + 1)]
+    
+    #Activates the chunks near the camera and parks the chunks that are far away
+    def updateChunks(self):
+        
+        first  = (self.camera.x - CHUNKMARGIN) // CHUNKWIDTH
+        last   = (self.camera.x + self.camera.width + CHUNKMARGIN) // CHUNKWIDTH
+        wanted = set([index for index in range(first, last + 1) if (index in self.chunks)])
+        
+        #Nothing to do while the camera stays in the same chunks
+        if (wanted == self.activeChunks):
+            return
         
-        #Shift all the coins
-        for sprite in self.coins:
-            sprite.rect.x += value
+        for index in sorted(self.activeChunks - wanted):
+            self.parkChunk(self.chunks[index])
+        for index in sorted(wanted - self.activeChunks):
+            self.activateChunk(self.chunks[index])
             
-        #Shift the texts
-        for texts in self.textList:
-            texts[1] += value
+        self.activeChunks = wanted
+    
+    #Adds the sprites of a chunk to the live sprite lists
+    #Parameters: chunk to activate
+    def activateChunk(self, chunk):
+        
+        #Platforms and obstacles can be in several chunks, they are added by the first of them
+        for sprite in chunk.platforms + chunk.obstacles:
+            self.staticRefs[sprite] = self.staticRefs.get(sprite, 0) + 1
+            if (self.staticRefs[sprite] == 1):
+                if (sprite in chunk.platforms):
+                    self.platforms.add(sprite)
+                else:
+                    self.obstacles.add(sprite)
+                self.allSprites.add(sprite)
+        
+        #Create the coins and enemies from their parked positions
+        for coinPos in chunk.coins:
+            coin = Coin(coinPos)
+            self.coins.add(coin)
+            self.allSprites.add(coin)
+            chunk.liveCoins.append(coin)
+            
+        for enem in chunk.enemies:
+            enemy = Enemy([enem[0], enem[1]], enem[2])
+            enemy.currentLevel = self
+            self.enemies.add(enemy)
+            self.allSprites.add(enemy)
+            self.dynamicSprites.add(enemy)
+            self.ai.add(enemy)
+            chunk.liveEnemies.append(enemy)
+        
+        chunk.coins   = []
+        chunk.enemies = []
+    
+    #Removes the sprites of a chunk from the live sprite lists, keeping only what is needed to bring them back
+    #Parameters: chunk to park
+    def parkChunk(self, chunk):
+        
+        #Platforms and obstacles are removed by the last active chunk they are in
+        for sprite in chunk.platforms + chunk.obstacles:
+            self.staticRefs[sprite] -= 1
+            if (self.staticRefs[sprite] == 0):
+                sprite.kill()
+        
+        #Coins that were collected and enemies that were killed are not parked
+        chunk.coins   = [(coin.rect.x, coin.rect.y) for coin in chunk.liveCoins if coin.alive()]
+        chunk.enemies = [(enemy.rect.x, enemy.rect.y, enemy.jumpTime) for enemy in chunk.liveEnemies if enemy.alive()]
+        
+        for sprite in chunk.liveCoins + chunk.liveEnemies:
+            sprite.kill()
+        chunk.liveCoins   = []
+        chunk.liveEnemies = []
+    
+    #Makes enemies jump at a target
+    #Parameters: target the enemies jump at (player), enemies whose interval between jumps has passed
+    def jumpEnemies(self, target, enemies):
+        
+        #The entity store checks the enemies at once
+        if (isinstance(self.dynamicSprites, EntityStore)):
+            self.dynamicSprites.jump(target, enemies)
+            return
+        
+        for enemy in enemies:
+            enemy.jump(target)
+    
+    #Returns the memory used by the entities of the level, as [number, bytes each, total bytes] for each type
+    #(bytes each are measured on new entities that are in as many sprite lists as the live ones, images are shared and not counted)
+    def memoryReport(self):
+        
+        shooter = Enemy([0, 0], 60)
+        shooter.currentLevel = self
+        kinds = [("coins", self.coins, lambda: Coin([0, 0])), ("enemies", self.enemies, lambda: Enemy([0, 0], 60)),
+                 ("bullets", self.playerBullets.sprites() + self.enemyBullets.sprites(), lambda: Bullet(shooter, 15, RED))]
+        
+        report = OrderedDict()
+        for name, sprites, make in kinds:
+            groupCount = 2 if (name == "coins") else 3
+            if (len(sprites) > 0):
+                groupCount = len(list(sprites)[0].groups())
+            each = measureEntities(make, groupCount)
+            report[name] = [len(sprites), each, len(sprites) * each]
+        
+        #Coins and enemies of parked chunks are kept as tuples of numbers
+        parked = [entry for chunk in self.chunks.values() for entry in chunk.coins + chunk.enemies]
+        parkedBytes = sum([sys.getsizeof(entry) + sum([sys.getsizeof(value) for value in entry]) for entry in parked])
+        report["parked"] = [len(parked), parkedBytes // max(1, len(parked)), parkedBytes]
+        
+        report["total"] = [sum([report[name][0] for name in report]), None, sum([report[name][2] for name in report])]
+        return report
+    
+    #Releases all the sprites of the level (called when the level is finished)
+    def unload(self):
+        
+        #Put the flying bullets back in the bullet pool
+        for bullet in self.playerBullets.sprites() + self.enemyBullets.sprites():
+            BULLETS.release(bullet)
+        
+        #Empty every sprite list, so the sprites and their surfaces can be freed
+        for group in [self.collisionObjects, self.enemies, self.allSprites, self.dynamicSprites, self.platforms, self.coins, self.obstacles]:
+            group.empty()
+        self.platformGrid = SpatialGrid()
+        self.obstacleGrid = SpatialGrid()
+        self.textList     = []
+        self.background.invalidate()
+        self.chunks       = {}
+        self.activeChunks = set()
+        self.staticRefs   = {}
+        self.ai           = AIScheduler(self)
+        
+    #Returns the world x position of the left side of the screen, between the last two updates when interpolating
+    def viewX(self):
+        return int(round(self.camera.prevX + (self.camera.x - self.camera.prevX) * self.alpha))
+    
+    #Returns where a sprite is drawn on the screen, between its last two positions when interpolating
+    #Parameters: sprite
+    def screenRect(self, sprite):
+        
+        rect = sprite.rect.move(-self.viewX(), 0)
         
-        #Shift all of the obstacles
-        for obs in self.obstacles:
-            obs.rect.x += value
+        #Sprites remember their position before the last update only while interpolation is on
+        if (self.alpha < 1 and getattr(sprite, "prevPos", None) is not None):
+            rect.x = int(round(sprite.prevPos[0] + (sprite.rect.x - sprite.prevPos[0]) * self.alpha)) - self.viewX()
+            rect.y = int(round(sprite.prevPos[1] + (sprite.rect.y - sprite.prevPos[1]) * self.alpha))
         
-        #Shift all of the enemies
-        for enem in self.enemies:
-            enem.rect.x += value
+        return rect
+    
+    #Draws the visible sprites of a group, translated by the camera
+    #Parameters: Screen to draw on, group of sprites to draw
+    def drawGroup(self, screen, group):
+        
+        for sprite in group:
+            if (self.camera.isVisible(sprite.rect)):
+                screen.blit(sprite.image, self.screenRect(sprite))
         
     #Method to update all sprites and draw the level to the screen
     #Parameters: Screen to draw on
     def draw(self, screen):
         
-        #Draw the background
-        screen.fill(WHITE)
+        #Draw the background with the platforms and obstacles already drawn on it
+        self.background.draw(screen, self.viewX())
         
-        #Draw the sprites
-        self.allSprites.draw(screen)
+        #Draw the sprites on top of it (bullets last)
+        for group in [self.coins, self.enemies, self.playerBullets, self.enemyBullets]:
+            self.drawGroup(screen, group)
         
         #Draw texts
         for texts in self.textList:
-            text = font1.render(texts[0], True, BLACK)
-            screen.blit(text, [texts[1], texts[2]])
+            text = TEXTS.render(font1, texts[0], BLACK)
+            screen.blit(text, [texts[1] - self.viewX(), texts[2]])
        
 
+#-------------------------------------------------------------------------------
+#Background of a level with the platforms and obstacles drawn on it, cached in tiles one chunk wide
+class BackgroundLayer(object):
+    #ATTRIBUTES
+    level    = None
+    tiles    = None
+    maxTiles = None
+    builds   = None
+    
+    #Constructor Method
+    #Parameters: level the background belongs to, number of tiles to keep
+    def __init__(self, level, maxTiles = 4):
+        
+        self.level    = level
+        self.maxTiles = maxTiles
+        
+        #Drawn tiles keyed by chunk index, least recently used first
+        self.tiles = OrderedDict()
+        
+        #Count how many tiles were drawn
+        self.builds = 0
+    
+    #Returns the tile of a chunk, drawing it if it isn't cached
+    #Parameters: index of the chunk
+    def tile(self, index):
+        
+        if (index in self.tiles):
+            self.tiles.move_to_end(index)
+            return self.tiles[index]
+        
+        #Draw the platforms and obstacles that reach into the tile onto the background colour
+        tileRect = pygame.Rect(index * CHUNKWIDTH, 0, CHUNKWIDTH, self.level.camera.height)
+        tile = pygame.Surface(tileRect.size)
+        if (pygame.display.get_surface() is not None):
+            tile = tile.convert()
+        tile.fill(WHITE)
+        
+        for grid in [self.level.platformGrid, self.level.obstacleGrid]:
+            for sprite in grid.query(tileRect):
+                tile.blit(sprite.image, [sprite.rect.x - tileRect.x, sprite.rect.y])
+        
+        #Forget the least recently used tile if there are too many
+        self.tiles[index] = tile
+        self.builds += 1
+        if (len(self.tiles) > self.maxTiles):
+            self.tiles.popitem(last = False)
+        
+        return tile
+    
+    #Draws the part of the background that is on the screen
+    #Parameters: screen to draw on, world x position of the left side of the screen
+    def draw(self, screen, x):
+        
+        for index in range(x // CHUNKWIDTH, (x + screen.get_width() - 1) // CHUNKWIDTH + 1):
+            screen.blit(self.tile(index), [index * CHUNKWIDTH - x, 0])
+    
+    #Throws away cached tiles, so they are drawn again (call when platforms or obstacles change)
+    #Parameters: rect in the world that changed (everything if not given)
+    def invalidate(self, rect = None):
+        
+        for index in list(self.tiles):
+            if (rect is None or pygame.Rect(index * CHUNKWIDTH, 0, CHUNKWIDTH, self.level.camera.height).colliderect(rect)):
+                del self.tiles[index]
+
+
+#-------------------------------------------------------------------------------
+#Class for a chunk, a fixed width slice of a level
+class Chunk(object):
+    #ATTRIBUTES
+    platforms   = None
+    obstacles   = None
+    coins       = None
+    enemies     = None
+    liveCoins   = None
+    liveEnemies = None
+    
+    #Constructor Method
+    def __init__(self):
+        
+        #Platforms and obstacles that reach into this chunk
+        self.platforms = []
+        self.obstacles = []
+        
+        #Parked coins [x, y] and enemies [x, y, interval between jumps] while the chunk isn't active
+        self.coins   = []
+        self.enemies = []
+        
+        #Coin and enemy sprites while the chunk is active
+        self.liveCoins   = []
+        self.liveEnemies = []
+        
+
+#-------------------------------------------------------------------------------
+#Class for the camera that decides which part of a level is on the screen
+class Camera(object):
+    #ATTRIBUTES
+    x      = None
+    prevX  = None
+    width  = None
+    height = None
+    left   = None
+    right  = None
+    
+    #Constructor Method
+    #Parameters: size of the screen, screen x positions that the player is kept between
+    def __init__(self, size = (1366, 768), left = 366, right = 1000):
+        
+        #World x position of the left side of the screen, now and before the last update
+        self.x     = 0
+        self.prevX = 0
+        
+        self.width  = size[0]
+        self.height = size[1]
+        self.left   = left
+        self.right  = right
+    
+    #Scrolls the camera so that the target stays between the left and right scroll borders
+    #Parameters: sprite to follow
+    def follow(self, target):
+        
+        #Check if the target has reached the right side of the screen, if so scroll
+        if (target.rect.x - self.x > self.right):
+            self.x = target.rect.x - self.right
+        
+        #Check if the target has reached the left side of the screen, if so scroll
+        if (target.rect.x - self.x < self.left):
+            self.x = target.rect.x - self.left
+    
+    #Returns whether a rect in the world is (partly) on the screen
+    #Parameters: rect in the world, extra distance around the screen that counts as visible
+    def isVisible(self, rect, margin = 0):
+        return (rect.right > self.x - margin and rect.left < self.x + self.width + margin)
+    
+
+#-------------------------------------------------------------------------------
+#Uniform grid of static sprites, used to find the sprites near a rect without testing all of them
+class SpatialGrid(object):
+    #ATTRIBUTES
+    cellSize = None
+    cells    = None
+    order    = None
+    
+    #Constructor Method
+    #Parameters: width and height of each grid cell
+    def __init__(self, cellSize = 256):
+        
+        self.cellSize = cellSize
+        
+        #Lists of sprites keyed by [column, row] of the cell
+        self.cells = {}
+        
+        #Order the sprites were added in, so results come back in the same order as a sprite group
+        self.order = {}
+    
+    #Returns the [column, row] of every cell a rect touches
+    #Parameters: rect to look up
+    def cellsOf(self, rect):
+        
+        left   = rect.left // self.cellSize
+        right  = (rect.right - 1) // self.cellSize
+        top    = rect.top // self.cellSize
+        bottom = (rect.bottom - 1) // self.cellSize
+        
+        return [(column, row) for column in range(left, right + 1) for row in range(top, bottom + 1)]
+    
+    #Adds a sprite to every cell that its rect touches
+    #Parameters: sprite to add
+    def add(self, sprite):
+        
+        if (sprite in self.order):
+            return
+        
+        self.order[sprite] = len(self.order)
+        for cell in self.cellsOf(sprite.rect):
+            self.cells.setdefault(cell, []).append(sprite)
+    
+    #Removes a sprite from the grid
+    #Parameters: sprite to remove
+    def remove(self, sprite):
+        
+        if (sprite not in self.order):
+            return
+        
+        del self.order[sprite]
+        for cell in self.cellsOf(sprite.rect):
+            self.cells[cell].remove(sprite)
+    
+    #Returns the sprites in the cells that a rect touches (they don't have to overlap it)
+    #Parameters: rect to look up
+    def query(self, rect):
+        
+        candidates = set()
+        for cell in self.cellsOf(rect):
+            if (cell in self.cells):
+                candidates.update(self.cells[cell])
+        
+        return sorted(candidates, key = self.order.get)
+    
+    #Returns the sprites that overlap a rect (same result as spritecollide against the whole group)
+    #Parameters: rect to test
+    def collide(self, rect):
+        return [sprite for sprite in self.query(rect) if rect.colliderect(sprite.rect)]
+    
+
+#-------------------------------------------------------------------------------
+#Measures the memory of one entity, including its rect and its place in its sprite lists
+#Parameters: function that makes an entity, number of sprite lists it is in, number of entities to average over
+#Returns: bytes per entity
+def measureEntities(make, groupCount, count = 100):
+    
+    tracing = tracemalloc.is_tracing()
+    if (not tracing):
+        tracemalloc.start()
+    
+    #Make one first, so shared images and caches are not counted
+    make()
+    groups = [pygame.sprite.Group() for i in range(groupCount)]
+    
+    before  = tracemalloc.get_traced_memory()[0]
+    sprites = [make() for i in range(count)]
+    for group in groups:
+        group.add(sprites)
+    size = tracemalloc.get_traced_memory()[0] - before
+    
+    for sprite in sprites:
+        sprite.kill()
+    if (not tracing):
+        tracemalloc.stop()
+    
+    return size // count
+    
+
 #-------------------------------------------------------------------------------
 #Class for a coin
-class Coin(pygame.sprite.Sprite):
+class Coin(CompactSprite):
     #ATTRIBUTES
-    image = None
+    __slots__ = ("image", "rect")
     
     #Constructor Method
     #Parameters: position of coin
@@ -429,9 +1030,7 @@ class Coin(pygame.sprite.Sprite):
         super(Coin, self).__init__()
         
         #Set the coin's size, graphic and position
-        self.image = pygame.Surface([45, 50])
-        self.image = importImage("images/coin.png")
-        self.image.set_colorkey(WHITE)
+        self.image  = ASSETS.get("images/coin.png", WHITE)
         self.rect   = self.image.get_rect()
         self.rect.x = pos[0]
         self.rect.y = pos[1]
@@ -439,11 +1038,13 @@ class Coin(pygame.sprite.Sprite):
 
 #-------------------------------------------------------------------------------
 #Class for a bullet
-class Bullet(pygame.sprite.Sprite):
+class Bullet(CompactSprite):
     
     #ATTRIBUTES
-    velocityX = None
-    image     = None
+    __slots__ = ("image", "rect", "velocityX", "currentLevel", "active", "prevPos", "store", "row")
+    
+    #Attributes kept in the columns of the entity store the bullet is in
+    COMPONENTS = ("velocityX",)
     
     #Constructor Method
     #Parameters: sprite who shoots bullet, algebraic speed of bullet, colour
@@ -452,10 +1053,20 @@ class Bullet(pygame.sprite.Sprite):
         #Call the parent pygame sprite constructor
         super(Bullet, self).__init__()
         
-        #Create the Bullet image
-        self.image = pygame.Surface([10, 10])
+        #Not in an entity store yet
+        self.store = None
+        self.row   = None
+        
+        #Set the bullet's image, position and speed
+        self.reset(shooter, velocityX, colour)
+    
+    #Gets the bullet ready to be fired (also used when a pooled bullet is reused)
+    #Parameters: sprite who shoots bullet, algebraic speed of bullet, colour
+    def reset(self, shooter, velocityX, colour):
+        
+        #Use the shared Bullet image of this colour
+        self.image = BULLETS.image(colour)
         self.rect  = self.image.get_rect()
-        self.image.fill(colour)
         
         #Set the bullet's position to the shooter
         self.rect.x = shooter.rect.x 
@@ -463,99 +1074,1419 @@ class Bullet(pygame.sprite.Sprite):
         
         #Set the x velocity based on parameter
         self.velocityX = velocityX
+        
+        #Remember the level the bullet flies in
+        self.currentLevel = shooter.currentLevel
+        self.active = True
+        
+        #Forget where the bullet was in its last life, so it is not drawn sliding from there
+        self.prevPos = None
     
     #Updates the position of the bullet
     def update(self):
         
         #Move the bullet
         self.rect.x += self.velocityX
+        
+        #Remove the bullet once it is far away from the screen
+        if (not self.currentLevel.camera.isVisible(self.rect, BULLETMARGIN)):
+            BULLETS.release(self)
+
+#A bullet in an entity store is a facade over its row
+Bullet.velocityX = Component("velocityX", Bullet.velocityX)
     
 
 #-------------------------------------------------------------------------------
-#Displays the HUD
-def displayHud(level, health, coin, ammo, score, disHud, disLog, logLst):        
+#Pool of bullets, so that bullets are reused instead of created for every shot
+class BulletPool(object):
+    #ATTRIBUTES
+    free    = None
+    images  = None
+    live    = None
+    created = None
     
-    #HUD
-    #If player toggles HUD on, display HUD
-    if (disHud == True):
-        #HUD background
-        pygame.draw.rect(screen, SKYBLUE, [0, 0, 1366, 50], 0)
-        
-        #Change colour of health box based on health remaining
-        if (health <= 10):
-            boxColour = RED
-        elif (health <= 25):
-            boxColour = ORANGE
-        elif (health <= 50):
-            boxColour = YELLOW
-        else:
-            boxColour = GREEN
-
-        #Draw health bar based on health remaining
-        if (health > 0):
-            pygame.draw.rect(screen, boxColour, [235, 10, 2*health , 30], 0)   
-        
-        #Render text
-        levelText  = font1.render('Level: ' + str(level), True, BLACK)
-        healthText = font1.render('Health', True, BLACK)
+    #Constructor Method
+    def __init__(self):
         
-        #Health bar displays a minimum of 0 health
-        if (health < 0):
-            healthNum = font1.render('0/100', True, BLACK)
-        else:
-            healthNum = font1.render(str(health) + '/100', True, BLACK)
+        #Bullets that are not flying and can be reused
+        self.free = []
         
-        #Render all the text in the HUD
-        coinsText = font1.render('Coins: x' + str(coin).zfill(3), True, BLACK)
-        ammoText  = font1.render('Ammo: ' + str(ammo) + '/20'   , True, BLACK)
-        scoreText = font1.render('Score: ' + str(score).zfill(6), True, BLACK)
-        timeText  = font1.render('Time: ' + str(time).zfill(3)  , True, BLACK)
+        #One filled bullet image for each colour
+        self.images = {}
         
-        #Display text
-        screen.blit(levelText ,  [15, 15])
-        screen.blit(healthText, [150, 15])
-        screen.blit(healthNum , [300, 15])
-        screen.blit(coinsText , [485, 15])
-        screen.blit(ammoText  , [650, 15])
-        screen.blit(scoreText , [815, 15])
-        screen.blit(timeText  ,[1000, 15])
-
-    #HELPER TEXT BOX/ LOG
-    #If player toggles helper text on, display it
-    if (disLog == True):
-        pygame.draw.rect(screen, BLACK, [965, 50, 400, 155], 2)
+        #Count the bullets that are flying, and the bullets that were ever made
+        self.live    = 0
+        self.created = 0
+    
+    #Returns the number of bullets waiting in the pool
+    @property
+    def pooled(self):
+        return len(self.free)
+    
+    #Returns the shared bullet image of a colour
+    #Parameters: colour of the bullet
+    def image(self, colour):
         
-        logPos = 190
-        #Text in helper text box is only printed within box
-        for i in range(-1, -len(logLst)-1, -1):
-            
-            #Render text
-            bottom = font2.render(logLst[i], True, BLACK)
-            #Display text 
-            if (logPos >= 50):
-                screen.blit(bottom, [970, logPos])
-            logPos -= 15
-
+        if (colour not in self.images):
+            self.images[colour] = pygame.Surface([10, 10])
+            self.images[colour].fill(colour)
             
-#-------------------------------------------------------------------------------
-#Imports an image
-def importImage(path):
+        return self.images[colour]
     
-    try:
-        image = pygame.image.load(path)
-    except:
-        image = None
+    #Returns a bullet ready to be fired, reusing a pooled bullet if there is one
+    #Parameters: sprite who shoots bullet, algebraic speed of bullet, colour
+    def acquire(self, shooter, velocityX, colour):
         
-    return image
-    
+        if (len(self.free) > 0):
+            bullet = self.free.pop()
+            bullet.reset(shooter, velocityX, colour)
+        else:
+            bullet = Bullet(shooter, velocityX, colour)
+            self.created += 1
+            
+        self.live += 1
+        return bullet
     
-#-------------------------------------------------------------------------------
-#Ends the game and displays the ending screen
-def displayEndScreen(screen, player, reason, time):
+    #Removes a bullet from all sprite lists and puts it back in the pool
+    #Parameters: bullet to remove
+    def release(self, bullet):
+        
+        #A bullet can hit several things in one frame, but is only released once
+        if (not bullet.active):
+            return
+        
+        bullet.kill()
+        bullet.active       = False
+        bullet.currentLevel = None
+        self.free.append(bullet)
+        self.live -= 1
+
+#Shared bullet pool
+BULLETS = BulletPool()
+
+
+#-------------------------------------------------------------------------------
+#Sprite list that keeps the components of its sprites (position, collider, velocity, frame, ammo, health, facing)
+#in NumPy columns, one row per sprite, so that gravity, movement, platform collisions and bullet removal can run for all sprites at once
+#While a sprite is in the store its row is what counts: the sprite's components read and write the row (see Component),
+#and its rect is kept in step with the position after every update
+class EntityStore(pygame.sprite.Group):
+    #ATTRIBUTES
+    level        = None
+    rows         = None
+    x            = None
+    y            = None
+    width        = None
+    height       = None
+    velocityX    = None
+    velocityY    = None
+    falls        = None
+    expires      = None
+    currentFrame = None
+    ammo         = None
+    health       = None
+    facing       = None
+    
+    #Constructor Method
+    #Parameters: level the sprites are in, number of rows to start with
+    def __init__(self, level, capacity = 64):
+        
+        super(EntityStore, self).__init__()
+        self.level = level
+        
+        #Sprite of each row
+        self.rows = []
+        
+        #Columns: position, collider size, velocity, whether the sprite falls and hits platforms (enemies),
+        #whether it is removed away from the screen (bullets), frames updated, ammo, health, and the way the sprite's image faces
+        #(ammo is a float, enemies have almost unlimited ammo)
+        self.x            = numpy.zeros(capacity, numpy.int64)
+        self.y            = numpy.zeros(capacity, numpy.int64)
+        self.width        = numpy.zeros(capacity, numpy.int64)
+        self.height       = numpy.zeros(capacity, numpy.int64)
+        self.velocityX    = numpy.zeros(capacity)
+        self.velocityY    = numpy.zeros(capacity)
+        self.falls        = numpy.zeros(capacity, bool)
+        self.expires      = numpy.zeros(capacity, bool)
+        self.currentFrame = numpy.zeros(capacity, numpy.int64)
+        self.ammo         = numpy.zeros(capacity)
+        self.health       = numpy.zeros(capacity, numpy.int64)
+        self.facing       = numpy.zeros(capacity, numpy.int64)
+    
+    #Returns the names of the columns
+    def columns(self):
+        return ["x", "y", "width", "height", "velocityX", "velocityY", "falls", "expires", "currentFrame", "ammo", "health", "facing"]
+    
+    #Adds a row for a sprite that joins the store, moving the sprite's components into it (called by pygame)
+    #Parameters: sprite, layer (unused)
+    def add_internal(self, sprite, layer = None):
+        
+        super(EntityStore, self).add_internal(sprite, layer)
+        
+        #Double the size of the columns when they are full
+        row = len(self.rows)
+        if (row == len(self.x)):
+            for name in self.columns():
+                column = getattr(self, name)
+                setattr(self, name, numpy.concatenate([column, numpy.zeros_like(column)]))
+        
+        self.rows.append(sprite)
+        for name in self.columns():
+            getattr(self, name)[row] = 0
+        
+        self.x[row], self.y[row], self.width[row], self.height[row] = sprite.rect
+        self.falls[row]   = isinstance(sprite, MovingSprite)
+        self.expires[row] = isinstance(sprite, Bullet)
+        for name in sprite.COMPONENTS:
+            getattr(self, name)[row] = getattr(sprite, name)
+        
+        #From now on the sprite reads and writes its components in the row
+        sprite.store = self
+        sprite.row   = row
+    
+    #Removes the row of a sprite that leaves the store, giving its components back to the sprite (called by pygame)
+    #Parameters: sprite
+    def remove_internal(self, sprite):
+        
+        super(EntityStore, self).remove_internal(sprite)
+        
+        row    = sprite.row
+        values = [(name, getattr(self, name)[row].item()) for name in sprite.COMPONENTS]
+        sprite.store = None
+        sprite.row   = None
+        for name, value in values:
+            setattr(sprite, name, value)
+        
+        #Move the last row into the free row
+        last = self.rows.pop()
+        if (last is not sprite):
+            for name in self.columns():
+                column = getattr(self, name)
+                column[row] = column[len(self.rows)]
+            self.rows[row] = last
+            last.row = row
+    
+    #Returns the left, top, right and bottom of the platforms near an area, in the order they were added to the level
+    #(only the grid cells the area touches are looked at, so the cost does not grow with the length of the level)
+    #Parameters: rect of the area
+    def platformEdges(self, area):
+        
+        rects = [sprite.rect for sprite in self.level.platformGrid.query(area)]
+        return numpy.array([[rect.left, rect.top, rect.right, rect.bottom] for rect in rects], numpy.int64).reshape(-1, 4)
+    
+    #Returns, for each row, the last platform (in the order they were added) its rect overlaps, or -1,
+    #the number of platforms it overlaps, and the edges of the platforms the first result refers to
+    #Parameters: x, y, width and height of the rows
+    def hits(self, x, y, width, height):
+        
+        if (len(x) == 0):
+            return numpy.full(0, -1), numpy.zeros(0, numpy.int64), numpy.zeros((0, 4), numpy.int64)
+        
+        #Only the platforms around the rows can be hit
+        left, top = x.min().item(), y.min().item()
+        walls = self.platformEdges(pygame.Rect(left, top, (x + width).max().item() - left, (y + height).max().item() - top))
+        if (len(walls) == 0):
+            return numpy.full(len(x), -1), numpy.zeros(len(x), numpy.int64), walls
+        
+        #Same test as Rect.colliderect, for every row against every platform near the rows
+        hits = ((x[:, None] < walls[:, 2]) & (x[:, None] + width[:, None] > walls[:, 0]) &
+                (y[:, None] < walls[:, 3]) & (y[:, None] + height[:, None] > walls[:, 1]))
+        
+        last = len(walls) - 1 - numpy.argmax(hits[:, ::-1], axis = 1)
+        return numpy.where(hits.any(axis = 1), last, -1), hits.sum(axis = 1), walls
+    
+    #Moves every sprite one update (same rules as MovingSprite.update and Bullet.update)
+    def update(self, *args):
+        
+        count = len(self.rows)
+        if (count == 0):
+            return
+        
+        #A few sprites are updated one at a time (through their rows), then their new positions are put in the columns
+        if (count < VECTORROWS):
+            for sprite in list(self.rows):
+                sprite.update()
+            for sprite in self.rows:
+                self.x[sprite.row], self.y[sprite.row] = sprite.rect.topleft
+            return
+        
+        x, y, width, height = self.x[:count], self.y[:count], self.width[:count], self.height[:count]
+        velocityX, velocityY = self.velocityX[:count], self.velocityY[:count]
+        falls = self.falls[:count]
+        
+        #Gravity
+        velocityY[falls] += 0.45
+        
+        #Only the rows that fall hit platforms (bullets fly through them)
+        falling = numpy.flatnonzero(falls)
+        
+        #Move left and right (rects round halves away from zero), then push out of the platforms hit
+        x[:] = roundAway(x + velocityX)
+        hit, hitCount, walls = self.hits(x[falling], y[falling], width[falling], height[falling])
+        blocked, wall = falling[hit >= 0], hit[hit >= 0]
+        x[blocked] = numpy.where(velocityX[blocked] > 0, walls[wall, 0] - width[blocked], walls[wall, 2])
+        
+        #Move up and down, then push out of the platforms hit and stop falling
+        #(the speed is 0 after the first platform, so a sprite in several platforms ends up below the last one)
+        y[:] = roundAway(y + velocityY)
+        hit, hitCount, walls = self.hits(x[falling], y[falling], width[falling], height[falling])
+        blocked, wall, hitCount = falling[hit >= 0], hit[hit >= 0], hitCount[hit >= 0]
+        y[blocked] = numpy.where((velocityY[blocked] > 0) & (hitCount == 1), walls[wall, 1] - height[blocked], walls[wall, 3])
+        velocityY[blocked] = 0
+        
+        self.currentFrame[:count][falls] += 1
+        
+        #Write the new positions back to the rects, which are used for drawing and for collisions with the player
+        for sprite, left, top in zip(self.rows, x.tolist(), y.tolist()):
+            sprite.rect.x = left
+            sprite.rect.y = top
+        
+        #Remove the bullets that are far away from the screen
+        camera  = self.level.camera
+        visible = (x + width > camera.x - BULLETMARGIN) & (x < camera.x + camera.width + BULLETMARGIN)
+        for bullet in [self.rows[row] for row in numpy.flatnonzero(self.expires[:count] & ~visible)]:
+            BULLETS.release(bullet)
+    
+    #Makes sprites jump if they stand on something and the target is near (same rules as Enemy.jump)
+    #Parameters: target (player), sprites that may jump
+    def jump(self, target, sprites):
+        
+        #A few sprites jump one at a time
+        if (len(self.rows) < VECTORROWS):
+            for sprite in sprites:
+                sprite.jump(target)
+            return
+        
+        rows = numpy.array([sprite.row for sprite in sprites], numpy.int64)
+        x, y = self.x[rows], self.y[rows]
+        
+        near = (numpy.abs(target.rect.x - x) < 700) & (numpy.abs(target.rect.y - y) < 400)
+        rows, x, y = rows[near], x[near], y[near]
+        
+        #Standing on a platform, or on the ground
+        standing = (self.hits(x, y + 2, self.width[rows], self.height[rows])[0] >= 0) | (y > 717)
+        self.velocityY[rows[standing]] = -10
+
+
+#-------------------------------------------------------------------------------
+#Schedules the enemies of a level, so that only the enemies that can act this frame are looked at
+#Jumps are kept in a timer wheel (a list of enemies for each frame), shooting uses an index of the enemies sorted by x position
+class AIScheduler(object):
+    #ATTRIBUTES
+    level   = None
+    wheel   = None
+    now     = None
+    keys    = None
+    indexed = None
+    pending = None
+    fresh   = None
+    woken   = None
+    
+    #Constructor Method
+    #Parameters: level the enemies are in
+    def __init__(self, level):
+        
+        self.level = level
+        
+        #Enemies that jump in each frame, and the last frame that was run
+        self.wheel = {}
+        self.now   = None
+        
+        #X positions of the enemies, sorted, and the enemy at each position
+        self.keys    = []
+        self.indexed = []
+        
+        #Enemies not scheduled yet, and enemies that may still be pushed out of a platform by their first update
+        self.pending = []
+        self.fresh   = []
+        
+        #Number of enemies woken up to jump
+        self.woken = 0
+    
+    #Adds an enemy (it is scheduled on the next run, when the frame number is known)
+    #Parameters: enemy
+    def add(self, enemy):
+        self.pending.append(enemy)
+    
+    #Adds an enemy to the x position index
+    #Parameters: enemy
+    def index(self, enemy):
+        
+        position = bisect_right(self.keys, enemy.rect.x)
+        self.keys.insert(position, enemy.rect.x)
+        self.indexed.insert(position, enemy)
+        enemy.indexX = enemy.rect.x
+    
+    #Removes an enemy from the x position index
+    #Parameters: enemy
+    def unindex(self, enemy):
+        
+        #Dead enemies can be found both by the index and by the heap, they are only removed once
+        if (enemy.indexX is None):
+            return
+        
+        position = bisect_left(self.keys, enemy.indexX)
+        while (self.indexed[position] is not enemy):
+            position += 1
+        del self.keys[position]
+        del self.indexed[position]
+        enemy.indexX = None
+    
+    #Returns the live enemies less than a distance away from a target in x, and forgets the dead ones found
+    #Parameters: target, distance
+    def near(self, target, distance):
+        
+        first = bisect_right(self.keys, target.rect.x - distance)
+        last  = bisect_left(self.keys, target.rect.x + distance)
+        
+        enemies = self.indexed[first:last]
+        for enemy in enemies:
+            if (not enemy.alive()):
+                self.unindex(enemy)
+        
+        return [enemy for enemy in enemies if enemy.alive()]
+    
+    #Makes the enemies shoot and jump that can this frame
+    #Parameters: target (player), frame number
+    def run(self, target, frame):
+        
+        #Schedule the new enemies for the first frame that is a multiple of their interval between jumps
+        for enemy in self.pending:
+            self.wheel.setdefault(-(-frame // enemy.jumpTime) * enemy.jumpTime, []).append(enemy)
+            self.index(enemy)
+            self.fresh.append((frame, enemy))
+        self.pending = []
+        
+        #Shoot every SHOOTINTERVAL frames, only enemies close enough can hit the target
+        if (frame % SHOOTINTERVAL == 0):
+            
+            #Enemies pushed out of a platform by their first update are moved in the index
+            for added, enemy in self.fresh:
+                if (added < frame and enemy.alive() and enemy.rect.x != enemy.indexX):
+                    self.unindex(enemy)
+                    self.index(enemy)
+            self.fresh = [(added, enemy) for added, enemy in self.fresh if (added == frame)]
+            
+            for enemy in self.near(target, 500):
+                enemy.shoot(target)
+        
+        #Wake the enemies whose interval between jumps has passed (also for frames that were skipped), and schedule their next jump
+        first = frame
+        if (self.now is not None and self.now < frame):
+            first = self.now + 1
+        self.now = frame
+        
+        due = []
+        for wakeFrame in range(first, frame + 1):
+            for enemy in self.wheel.pop(wakeFrame, []):
+                
+                #Killed and parked enemies are dropped
+                if (not enemy.alive()):
+                    self.unindex(enemy)
+                    continue
+                
+                if (enemy.rect.x != enemy.indexX):
+                    self.unindex(enemy)
+                    self.index(enemy)
+                
+                due.append(enemy)
+                self.wheel.setdefault(wakeFrame + enemy.jumpTime, []).append(enemy)
+        
+        self.woken += len(due)
+        if (len(due) > 0):
+            self.level.jumpEnemies(target, due)
+
+
+#-------------------------------------------------------------------------------
+#Rounds halves away from zero, like a pygame rect does when it is given a float
+#Parameters: NumPy array
+#Returns: NumPy array of whole numbers
+def roundAway(values):
+    return (numpy.sign(values) * numpy.floor(numpy.abs(values) + 0.5)).astype(numpy.int64)
+
+
+#-------------------------------------------------------------------------------
+#Displays the HUD
+#Parameters: screen to draw on, level number, health, coins, ammo, score and time left of the player, whether to show the HUD and log, log
+def displayHud(screen, level, health, coin, ammo, score, time, disHud, disLog, logLst):        
+    
+    #HUD
+    #If player toggles HUD on, display HUD
+    if (disHud == True):
+        #HUD background
+        pygame.draw.rect(screen, SKYBLUE, [0, 0, 1366, 50], 0)
+        
+        #Change colour of health box based on health remaining
+        if (health <= 10):
+            boxColour = RED
+        elif (health <= 25):
+            boxColour = ORANGE
+        elif (health <= 50):
+            boxColour = YELLOW
+        else:
+            boxColour = GREEN
+
+        #Draw health bar based on health remaining
+        if (health > 0):
+            pygame.draw.rect(screen, boxColour, [235, 10, 2*health , 30], 0)   
+        
+        #Render text
+        levelText  = TEXTS.render(font1, 'Level: ' + str(level), BLACK)
+        healthText = TEXTS.render(font1, 'Health', BLACK)
+        
+        #Health bar displays a minimum of 0 health
+        if (health < 0):
+            healthNum = TEXTS.render(font1, '0/100', BLACK)
+        else:
+            healthNum = TEXTS.render(font1, str(health) + '/100', BLACK)
+        
+        #Render all the text in the HUD
+        coinsText = TEXTS.render(font1, 'Coins: x' + str(coin).zfill(3), BLACK)
+        ammoText  = TEXTS.render(font1, 'Ammo: ' + str(ammo) + '/20'   , BLACK)
+        scoreText = TEXTS.render(font1, 'Score: ' + str(score).zfill(6), BLACK)
+        timeText  = TEXTS.render(font1, 'Time: ' + str(time).zfill(3)  , BLACK)
+        
+        #Display text
+        screen.blit(levelText ,  [15, 15])
+        screen.blit(healthText, [150, 15])
+        screen.blit(healthNum , [300, 15])
+        screen.blit(coinsText , [485, 15])
+        screen.blit(ammoText  , [650, 15])
+        screen.blit(scoreText , [815, 15])
+        screen.blit(timeText  ,[1000, 15])
+
+    #HELPER TEXT BOX/ LOG
+    #If player toggles helper text on, display it
+    if (disLog == True):
+        pygame.draw.rect(screen, BLACK, [965, 50, 400, 155], 2)
+        
+        logPos = 190
+        #Only the newest lines that fit in the helper text box are drawn, newest at the bottom
+        for line in reversed(logLst.rendered(font2, LOGLINES)):
+            screen.blit(line, [970, logPos])
+            logPos -= 15
+
+            
+#-------------------------------------------------------------------------------
+#Resolves all collisions of a frame, with one pass for each pair of sprite lists
+#Damage, score and removals are applied together at the end
+#Parameters: player, level the player is in
+#Returns: number of coins the player collected
+def resolveCollisions(player, level):
+    
+    #COINS:
+    #Count the coins the player has collected (they are removed from all sprite lists)
+    with PROFILER.scope("collisions.coins"):
+        coinList = pygame.sprite.spritecollide(player, level.coins, True)
+    
+    #OBSTACLES:
+    #Count the deadly obstacles the player has collided with
+    with PROFILER.scope("collisions.obstacles"):
+        obsCollided = level.obstacleGrid.collide(player.rect)
+    
+    #ENEMIES:
+    #Count the enemies the player collided with (they are removed from all sprite lists)
+    with PROFILER.scope("collisions.enemies"):
+        enemiesCollided = pygame.sprite.spritecollide(player, level.enemies, True)
+    
+    #BULLETS:
+    with PROFILER.scope("collisions.bullets"):
+        #Match every player bullet against the enemies at once (a bullet only hits enemies that are still alive)
+        enemiesShot = {}
+        for bull, enemies in pygame.sprite.groupcollide(level.playerBullets, level.enemies, False, False).items():
+            enemies = [enem for enem in enemies if (enem.health > 0)]
+            for enem in enemies:
+                enem.health -= 1
+            if (len(enemies) > 0):
+                enemiesShot[bull] = enemies
+        
+        #Find the bullets that hit a platform, using the spatial index
+        bulletsCollidedPlats = [bull for bull in level.playerBullets if (len(level.platformGrid.collide(bull.rect)) > 0)]
+        bulletsCollidedPlats += [bull for bull in level.enemyBullets if (len(level.platformGrid.collide(bull.rect)) > 0)]
+        
+        #Count the enemy bullets that hit the player (bullets stopped by a platform don't count)
+        bulletsCollidedPlayer = [bull for bull in pygame.sprite.spritecollide(player, level.enemyBullets, False) if (bull not in bulletsCollidedPlats)]
+    
+    #--- Apply the results
+    #Give the player points for each coin, add 1 to the player's coins, and give him a small jump
+    for coin in coinList:
+        player.score  += 100
+        player.coins  += 1
+        player.rect.y -= 10
+    
+    #Subtract 20 from health for each obstacle, and set player back before the obstacle
+    for obs in obsCollided:
+        player.health -= 20
+        player.rect.x  = obs.rect.x - 200
+        player.rect.y  = obs.rect.y - 200
+        LOGLST.append("You fell in lava! Be careful next time!") #Add to the helper text list
+    
+    #Subtract health for each enemy the player ran into, and set player back 5px
+    for enem in enemiesCollided:
+        player.rect.x -= 5
+        player.health -= 20
+        LOGLST.append("You ran into an enemy! How foolish!") #Add to the helper text list
+    
+    #Remove every enemy shot dead and give the player score for it
+    for bull in enemiesShot:
+        for enem in enemiesShot[bull]:
+            if (enem.health <= 0 and enem.alive()):
+                enem.kill()
+                player.score += 250
+                LOGLST.append("You shot an enemy!") #Add to the helper text list
+    
+    #Subtract 5 health for each enemy bullet that hit the player
+    for bull in bulletsCollidedPlayer:
+        player.health -= 5
+        LOGLST.append("Oh no! An enemy shot you") #Add to the helper text list
+    
+    #Remove every bullet that hit something, so that it won't be re-drawn
+    for bull in list(enemiesShot) + bulletsCollidedPlats + bulletsCollidedPlayer:
+        BULLETS.release(bull)
+        
+    return len(coinList)
+
+
+#-------------------------------------------------------------------------------
+#Displays the performance overlay
+#Parameters: screen to draw on, lines of text to show
+def displayProfiler(screen, lines):
+    
+    pygame.draw.rect(screen, WHITE, PROFILERBOX, 0)
+    pygame.draw.rect(screen, BLACK, PROFILERBOX, 2)
+    
+    logPos = PROFILERBOX[1] + 5
+    for line in lines:
+        screen.blit(TEXTS.render(font2, line, BLACK), [PROFILERBOX[0] + 5, logPos])
+        logPos += 15
+    
+    
+#-------------------------------------------------------------------------------
+#Loads the fonts used by the level, the HUD and the end screen
+def loadFonts():
+    global font1, font2, gameOverFont
+    
+    #Define fonts
+    font1        = pygame.font.SysFont("Consolas", 20, False, False)
+    font2        = pygame.font.SysFont("Consolas", 14, False, False)
+    gameOverFont = pygame.font.SysFont("Consolas", 30, False, False)
+    
+    
+#-------------------------------------------------------------------------------
+#Imports an image
+def importImage(path):
+    
+    try:
+        image = pygame.image.load(path)
+    except:
+        image = None
+        
+    return image
+    
+    
+#-------------------------------------------------------------------------------
+#Registry of shared image assets, each file is loaded and converted only once
+class AssetRegistry(object):
+    #ATTRIBUTES
+    images    = None
+    converted = None
+    clips     = None
+    textures  = None
+    hits      = None
+    misses    = None
+    
+    #Constructor Method
+    def __init__(self):
+        
+        #Loaded surfaces keyed by [path, colorkey]
+        self.images = {}
+        
+        #Keys of the surfaces that are already in the display's pixel format
+        self.converted = set()
+        
+        #Animations cut from the loaded sheets keyed by name
+        self.clips = {}
+        
+        #Top left corners cropped from big textures, keyed by path: [surface, size of the whole file]
+        self.textures = {}
+        
+        #Count how often a surface was shared or had to be loaded from disk
+        self.hits   = 0
+        self.misses = 0
+    
+    #Returns the shared surface for an image, loading it on the first request
+    #Parameters: path of the image, colour to make transparent (optional)
+    def get(self, path, colorkey = None):
+        
+        key = (path, colorkey)
+        
+        #Hand out the surface that is already loaded
+        if (key in self.images):
+            self.hits += 1
+        else:
+            #Load the image from disk only once
+            self.misses += 1
+            self.images[key] = importImage(path)
+            
+            if (self.images[key] is not None and colorkey is not None):
+                self.images[key].set_colorkey(colorkey)
+        
+        #Convert the image to the display format once (images loaded before the window existed are converted later)
+        if (self.images[key] is not None and key not in self.converted and pygame.display.get_init() and pygame.display.get_surface() is not None):
+            self.images[key] = self.convert(self.images[key], colorkey)
+            self.converted.add(key)
+        
+        return self.images[key]
+    
+    #Returns the shared top left corner of a big texture, cropping it at load so the rest of the file is never kept in memory
+    #Parameters: path of the texture, smallest size the crop has to be (it is never bigger than the file)
+    def texture(self, path, size):
+        
+        if (path in self.textures):
+            crop, fileSize = self.textures[path]
+            
+            #Hand out the crop if it already covers the size (the whole file, if the size is bigger than the file)
+            if (crop.get_width() >= min(size[0], fileSize[0]) and crop.get_height() >= min(size[1], fileSize[1])):
+                self.hits += 1
+                return crop
+            
+            #Crop a bigger corner that covers the old crop as well
+            size = (max(size[0], crop.get_width()), max(size[1], crop.get_height()))
+        
+        #Load the file, then keep only the corner (the copy lets the whole image be freed)
+        self.misses += 1
+        image = importImage(path)
+        fileSize = image.get_size()
+        crop = image.subsurface([0, 0, min(size[0], fileSize[0]), min(size[1], fileSize[1])]).copy()
+        del image
+        
+        #Convert the small crop to the display format, not the whole file
+        if (pygame.display.get_init() and pygame.display.get_surface() is not None):
+            crop = self.convert(crop, None)
+        
+        self.textures[path] = [crop, fileSize]
+        return crop
+    
+    #Returns the shared animation clip with a name from ANIMATIONS, cutting its frames on the first request
+    #Parameters: name of the animation
+    def clip(self, name):
+        
+        path, count, frameTime, colorkey = ANIMATIONS[name]
+        sheet = self.get(path, colorkey)
+        
+        #Cut the frames again if the sheet was converted to the display format since they were cut
+        if (name not in self.clips or self.clips[name].sheet is not sheet):
+            self.clips[name] = AnimationClip(sheet, count, frameTime, colorkey)
+        
+        return self.clips[name]
+    
+    #Converts a surface to the pixel format of the display
+    #Parameters: surface to convert, colour to make transparent
+    def convert(self, image, colorkey):
+        
+        #Keep per-pixel transparency, otherwise use the faster opaque format
+        if (image.get_flags() & pygame.SRCALPHA):
+            image = image.convert_alpha()
+        else:
+            image = image.convert()
+                
+        if (colorkey is not None):
+            image.set_colorkey(colorkey)
+            
+        return image
+    
+    #Loads a list of images ahead of time (e.g. before a level starts)
+    #Parameters: list of paths, colour to make transparent (optional)
+    def preload(self, paths, colorkey = None):
+        
+        for path in paths:
+            self.get(path, colorkey)
+    
+    #Removes images from the registry so their memory can be freed
+    #Parameters: list of paths to remove (removes everything if not given)
+    def evict(self, paths = None):
+        
+        if (paths is None):
+            self.images.clear()
+            self.converted.clear()
+            self.clips.clear()
+            self.textures.clear()
+        else:
+            for key in list(self.images):
+                if (key[0] in paths):
+                    del self.images[key]
+                    self.converted.discard(key)
+            for name in list(self.clips):
+                if (ANIMATIONS[name][0] in paths):
+                    del self.clips[name]
+            for path in list(self.textures):
+                if (path in paths):
+                    del self.textures[path]
+
+#Shared image registry used by all sprites
+ASSETS = AssetRegistry()
+
+
+#-------------------------------------------------------------------------------
+#Frames of an animation cut from one sprite sheet, shared by every sprite that plays it
+class AnimationClip(object):
+    #ATTRIBUTES (sheet is the shared surface the frames are views into)
+    sheet     = None
+    frames    = None
+    flipped   = None
+    frameTime = None
+    
+    #Constructor Method
+    #Parameters: sprite sheet, number of frames, seconds each frame is shown, colour to make transparent
+    def __init__(self, sheet, count, frameTime, colorkey = None):
+        
+        self.sheet     = sheet
+        self.frameTime = frameTime
+        self.frames    = []
+        self.flipped   = []
+        
+        #Cut the frames out of the sheet once, as views into it instead of copies
+        width = sheet.get_width() // count
+        for index in range(count):
+            frame = sheet.subsurface([index * width, 0, width, sheet.get_height()])
+            self.frames.append(frame)
+            
+            #Mirror each frame now for sprites facing left, so nothing is flipped while playing
+            #(the flipped copy keeps the sheet's pixel format and colorkey)
+            flipped = pygame.transform.flip(frame, True, False)
+            if (colorkey is not None):
+                flipped.set_colorkey(colorkey)
+            self.flipped.append(flipped)
+    
+    #Returns the frame to show
+    #Parameters: seconds since the animation started, direction the sprite faces (1 right, -1 left)
+    def frame(self, time, facing = 1):
+        
+        index = int(time / self.frameTime) % len(self.frames)
+        if (facing < 0):
+            return self.flipped[index]
+        return self.frames[index]
+
+
+#-------------------------------------------------------------------------------
+#Plays the sound effects and the background music
+#Effects are loaded the first time they are played, and each effect has its own channels so it can't use up all of them
+class SoundManager(object):
+    #ATTRIBUTES
+    enabled   = None
+    files     = None
+    volumes   = None
+    voices    = None
+    sounds    = None
+    channels  = None
+    nextVoice = None
+    music     = None
+    
+    #Constructor Method
+    #Parameters: files of the effects, volume of each effect, most copies of each effect playing at once
+    def __init__(self, files = SOUNDFILES, volumes = SOUNDVOLUMES, voices = SOUNDVOICES):
+        
+        #Nothing is played until the mixer is started
+        self.enabled = False
+        
+        self.files   = dict(files)
+        self.volumes = dict(volumes)
+        self.voices  = dict(voices)
+        
+        #Loaded effects keyed by name (None if the file is missing), and the channels of each effect
+        self.sounds    = {}
+        self.channels  = {}
+        self.nextVoice = {}
+        
+        #Whether the background music is playing
+        self.music = False
+    
+    #Starts the mixer and gives each effect its channels
+    #Returns: whether sound is on
+    def start(self):
+        
+        if (pygame.mixer.get_init() is None):
+            try:
+                pygame.mixer.init()
+            except pygame.error:
+                return False
+        
+        #Reserve channels for the effects, so other sounds never take them
+        count = sum([self.voices.get(name, 1) for name in self.files])
+        if (pygame.mixer.get_num_channels() < count):
+            pygame.mixer.set_num_channels(count)
+        pygame.mixer.set_reserved(count)
+        
+        first = 0
+        for name in sorted(self.files):
+            self.channels[name] = [pygame.mixer.Channel(i) for i in range(first, first + self.voices.get(name, 1))]
+            self.nextVoice[name] = 0
+            first += self.voices.get(name, 1)
+        
+        self.enabled = True
+        return True
+    
+    #Returns an effect, loading it on the first request (None if the file is missing)
+    #Parameters: name of the effect
+    def get(self, name):
+        
+        if (name not in self.sounds):
+            try:
+                self.sounds[name] = pygame.mixer.Sound(self.files[name])
+                self.sounds[name].set_volume(self.volumes.get(name, 1.0))
+            except (KeyError, pygame.error, FileNotFoundError):
+                self.sounds[name] = None
+        
+        return self.sounds[name]
+    
+    #Plays an effect on its next channel (the oldest copy playing is cut off once all its channels are busy)
+    #Parameters: name of the effect
+    def play(self, name):
+        
+        if (not self.enabled):
+            return
+        
+        sound = self.get(name)
+        if (sound is None):
+            return
+        
+        channels = self.channels[name]
+        channels[self.nextVoice[name]].play(sound)
+        self.nextVoice[name] = (self.nextVoice[name] + 1) % len(channels)
+    
+    #Changes the volume of an effect
+    #Parameters: name of the effect, volume from 0 to 1
+    def setVolume(self, name, volume):
+        
+        self.volumes[name] = volume
+        if (self.sounds.get(name) is not None):
+            self.sounds[name].set_volume(volume)
+    
+    #Streams music from a file, looping it
+    #Parameters: path of the music file, volume from 0 to 1
+    #Returns: whether the music is playing
+    def playMusic(self, path = MUSICFILE, volume = MUSICVOLUME):
+        
+        if (not self.enabled):
+            return False
+        
+        try:
+            pygame.mixer.music.load(path)
+        except (pygame.error, FileNotFoundError):
+            return False
+        
+        pygame.mixer.music.set_volume(volume)
+        pygame.mixer.music.play(-1)
+        self.music = True
+        return True
+    
+    #Fades the music out (does nothing if no music is playing)
+    #Parameters: time to fade out in milliseconds
+    def fadeoutMusic(self, time):
+        
+        if (self.music):
+            pygame.mixer.music.fadeout(time)
+            self.music = False
+
+#Shared sound manager
+SOUNDS = SoundManager()
+
+
+#-------------------------------------------------------------------------------
+#Puts frames on the screen, either with full flips or by only updating the regions that changed
+class Renderer(object):
+    #ATTRIBUTES
+    screen       = None
+    dirtyRects   = None
+    lastScene    = None
+    lastItems    = None
+    redrawAll    = None
+    pixelsPushed = None
+    maxRects     = None
+    
+    #Constructor Method
+    #Parameters: screen to draw on, whether to only update changed regions, number of regions after which they are merged into one
+    def __init__(self, screen, dirtyRects = True, maxRects = 24):
+        
+        self.screen     = screen
+        self.dirtyRects = dirtyRects
+        self.maxRects   = maxRects
+        
+        #What was on the screen in the last frame
+        self.lastScene = None
+        self.lastItems = set()
+        self.redrawAll = True
+        
+        #Number of pixels sent to the display in the last frame
+        self.pixelsPushed = 0
+    
+    #Makes the next frame redraw and update the whole screen
+    def invalidate(self):
+        self.redrawAll = True
+    
+    #Returns the screen regions and images of the visible sprites of some groups, to pass to render
+    #Parameters: level the sprites are in, list of sprite groups
+    def spriteItems(self, level, groups):
+        
+        items = []
+        for group in groups:
+            for sprite in group:
+                if (level.camera.isVisible(sprite.rect)):
+                    items.append((tuple(level.screenRect(sprite)), id(sprite.image)))
+        
+        return items
+    
+    #Draws a frame and updates the display
+    #Parameters: key that changes whenever the whole screen changes (e.g. the camera moved),
+    #            list of [screen region, state] for everything that can change without the whole screen changing,
+    #            function that draws the whole frame
+    def render(self, scene, items, draw):
+        
+        items = set(items)
+        
+        #Redraw everything when the scene changed, or when dirty regions are switched off
+        if (self.redrawAll or not self.dirtyRects or scene != self.lastScene):
+            with PROFILER.scope("draw"):
+                draw()
+            with PROFILER.scope("display"):
+                pygame.display.flip()
+            self.pixelsPushed = self.screen.get_width() * self.screen.get_height()
+        
+        else:
+            #Regions whose contents appeared, disappeared or changed since the last frame
+            screenRect = self.screen.get_rect()
+            rects = [screenRect.clip(pygame.Rect(item[0])) for item in items.symmetric_difference(self.lastItems)]
+            rects = [rect for rect in rects if (rect.width > 0 and rect.height > 0)]
+            
+            #Many small regions are cheaper to handle as one
+            if (len(rects) > self.maxRects):
+                rects = [rects[0].unionall(rects[1:])]
+            
+            #Draw the frame once, clipped to the area around the changed regions, then send only those regions to the display
+            with PROFILER.scope("draw"):
+                if (len(rects) > 0):
+                    self.screen.set_clip(rects[0].unionall(rects[1:]))
+                    draw()
+                    self.screen.set_clip(None)
+            
+            with PROFILER.scope("display"):
+                if (len(rects) > 0):
+                    pygame.display.update(rects)
+            self.pixelsPushed = sum([rect.width * rect.height for rect in rects])
+        
+        self.lastScene = scene
+        self.lastItems = items
+        self.redrawAll = False
+
+
+#-------------------------------------------------------------------------------
+#Times one named part of a frame (used with "with")
+class ProfileScope(object):
+    #ATTRIBUTES
+    profiler = None
+    name     = None
+    start    = None
+    
+    #Constructor Method
+    #Parameters: profiler to report to, name of the part of the frame
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name     = name
+    
+    #Starts the timer
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+    
+    #Stops the timer and adds the time to the current frame
+    def __exit__(self, *exception):
+        self.profiler.add(self.name, perf_counter() - self.start)
+        return False
+
+
+#-------------------------------------------------------------------------------
+#Scope that does nothing, handed out while profiling is off
+class NullScope(object):
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exception):
+        return False
+
+
+#-------------------------------------------------------------------------------
+#Profiled frames kept for exporting, stored as one array of numbers per column instead of a dictionary per frame
+#(about 8 bytes for each column of a frame, so a long play session can be kept)
+class ProfileTrace(object):
+    #ATTRIBUTES
+    capacity = None
+    columns  = None
+    integers = None
+    count    = None
+    
+    #Constructor Method
+    #Parameters: most frames kept (the oldest are dropped)
+    def __init__(self, capacity):
+        
+        self.capacity = capacity
+        self.clear()
+    
+    #Removes every frame
+    def clear(self):
+        
+        #Values of each column by name, in the order the columns first appeared (NaN where a frame has no value)
+        self.columns  = OrderedDict()
+        self.integers = set()
+        self.count    = 0
+    
+    #Adds a frame
+    #Parameters: dictionary of the frame's values by column name
+    def append(self, record):
+        
+        for name in record:
+            if (name not in self.columns):
+                self.columns[name] = array("d", [float("nan")]) * self.count
+            if (isinstance(record[name], int)):
+                self.integers.add(name)
+        
+        for name in self.columns:
+            self.columns[name].append(record.get(name, float("nan")))
+        self.count += 1
+        
+        #Drop the oldest frames a quarter of the capacity at a time, so frames are not moved on every append
+        if (self.count > self.capacity + self.capacity // 4):
+            for name in self.columns:
+                del self.columns[name][:self.count - self.capacity]
+            self.count = self.capacity
+    
+    #Returns the number of frames kept
+    def __len__(self):
+        return min(self.count, self.capacity)
+    
+    #Returns a frame as a dictionary of the values it has
+    #Parameters: index of the frame (negative counts from the newest)
+    def __getitem__(self, index):
+        
+        if (index < 0):
+            index += len(self)
+        if (index < 0 or index >= len(self)):
+            raise IndexError("profiled frame out of range")
+        
+        row = self.count - len(self) + index
+        record = OrderedDict()
+        for name in self.columns:
+            value = self.columns[name][row]
+            if (value == value):
+                record[name] = int(value) if (name in self.integers) else value
+        
+        return record
+    
+    #Returns every frame, oldest first
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+#-------------------------------------------------------------------------------
+#Collects frame times and the time of each named part of a frame
+class Profiler(object):
+    #ATTRIBUTES
+    enabled    = None
+    overlay    = None
+    scopes     = None
+    frame      = None
+    frameNo    = None
+    frameStart = None
+    window     = None
+    trace      = None
+    null       = None
+    
+    #Constructor Method
+    #Parameters: number of frames used for fps and percentiles, most frames kept for exporting
+    def __init__(self, windowSize = 120, traceSize = 100000):
+        
+        #Profiling is off until the overlay is shown or a benchmark turns it on
+        self.enabled = False
+        self.overlay = False
+        
+        #One reusable scope for each name, and the scope used while profiling is off
+        self.scopes = {}
+        self.null   = NullScope()
+        
+        #Times of the frame being measured, keyed by scope name
+        self.frame      = None
+        self.frameNo    = 0
+        self.frameStart = None
+        
+        #Recently finished frames for the overlay, and all finished frames for exporting
+        self.window = deque(maxlen = windowSize)
+        self.trace  = ProfileTrace(traceSize)
+    
+    #Returns the scope that times a part of the frame
+    #Parameters: name of the part
+    def scope(self, name):
+        
+        if (not self.enabled or self.frame is None):
+            return self.null
+        
+        if (name not in self.scopes):
+            self.scopes[name] = ProfileScope(self, name)
+        return self.scopes[name]
+    
+    #Adds time to a part of the current frame
+    #Parameters: name of the part, time in seconds
+    def add(self, name, seconds):
+        
+        if (self.frame is not None):
+            self.frame[name] = self.frame.get(name, 0.0) + seconds
+    
+    #Starts measuring a frame
+    def beginFrame(self):
+        
+        if (self.enabled):
+            self.frame      = OrderedDict()
+            self.frameStart = perf_counter()
+    
+    #Finishes measuring a frame
+    #Parameters: number of sprites in each sprite list
+    def endFrame(self, counts = None):
+        
+        if (self.frame is None):
+            return
+        
+        self.frameNo += 1
+        record = OrderedDict([("frame", self.frameNo), ("total", perf_counter() - self.frameStart)])
+        record.update(self.frame)
+        if (counts is not None):
+            record.update(counts)
+        
+        self.window.append(record)
+        self.trace.append(record)
+        self.frame = None
+    
+    #Returns a percentile of the recent frame times in seconds
+    #Parameters: percentile from 0 to 100
+    def percentile(self, percent):
+        
+        times = sorted([record["total"] for record in self.window])
+        if (len(times) == 0):
+            return 0.0
+        return times[int(round(percent / 100.0 * (len(times) - 1)))]
+    
+    #Returns the average frames per second of the recent frames
+    def fps(self):
+        
+        total = sum([record["total"] for record in self.window])
+        if (total == 0):
+            return 0.0
+        return len(self.window) / total
+    
+    #Returns the average time of each named part over the recent frames, in seconds
+    def averages(self):
+        
+        totals = OrderedDict()
+        for record in self.window:
+            for name in record:
+                if (isinstance(record[name], float) and name != "total"):
+                    totals[name] = totals.get(name, 0.0) + record[name]
+        
+        return OrderedDict([(name, totals[name] / len(self.window)) for name in totals])
+    
+    #Returns the lines of text shown in the overlay
+    def lines(self):
+        
+        if (len(self.window) == 0):
+            return ["Profiling..."]
+        
+        newest = self.window[-1]
+        lines  = ["FPS: " + str(int(round(self.fps()))) + "  frame ms p50/p95/p99: " + "/".join([str(round(self.percentile(p) * 1000, 1)) for p in (50, 95, 99)])]
+        
+        #Slowest parts of the frame first
+        averages = self.averages()
+        names = sorted(averages, key = averages.get, reverse = True)[:5]
+        lines.append("  ".join([name + " " + str(round(averages[name] * 1000, 2)) for name in names]))
+        
+        #Sprite counts of each sprite list
+        counts = [name + ": " + str(newest[name]) for name in newest if (isinstance(newest[name], int) and name != "frame")]
+        for i in range(0, len(counts), 3):
+            lines.append("  ".join(counts[i:i + 3]))
+        
+        return lines
+    
+    #Saves the profiled frames to a CSV or JSON file (decided by the file extension)
+    #Parameters: path of the file
+    def export(self, path):
+        
+        #Frames are written one at a time, so the whole trace is never turned into dictionaries at once
+        if (path.endswith(".json")):
+            with open(path, "w") as traceFile:
+                traceFile.write("[")
+                for index, record in enumerate(self.trace):
+                    traceFile.write(("," if (index > 0) else "") + "\n" + json.dumps(record))
+                traceFile.write("\n]\n")
+            return
+        
+        #Every scope that appeared in any frame gets a column (0 in the frames it didn't appear in)
+        with open(path, "w", newline = "") as traceFile:
+            writer = csv.DictWriter(traceFile, fieldnames = list(self.trace.columns), restval = 0)
+            writer.writeheader()
+            for record in self.trace:
+                writer.writerow(record)
+
+#Shared profiler
+PROFILER = Profiler()
+
+
+#-------------------------------------------------------------------------------
+#Cache of rendered text, so that text is only rasterised again when it changes
+class TextCache(object):
+    #ATTRIBUTES
+    capacity = None
+    surfaces = None
+    hits     = None
+    misses   = None
+    
+    #Constructor Method
+    #Parameters: maximum number of rendered texts to keep
+    def __init__(self, capacity = 256):
+        
+        self.capacity = capacity
+        
+        #Rendered texts keyed by [font, text, colour], least recently used first
+        self.surfaces = OrderedDict()
+        
+        #Count how often a text was reused or had to be rendered
+        self.hits   = 0
+        self.misses = 0
+    
+    #Returns the rendered surface of a text
+    #Parameters: font to render with, text, colour of the text
+    def render(self, font, text, colour):
+        
+        key = (font, text, colour)
+        
+        #Reuse the text if it was rendered before, and mark it as recently used
+        if (key in self.surfaces):
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return self.surfaces[key]
+        
+        #Render the text and forget the least recently used text if the cache is full
+        self.misses += 1
+        surface = font.render(text, True, colour)
+        self.surfaces[key] = surface
+        if (len(self.surfaces) > self.capacity):
+            self.surfaces.popitem(last = False)
+        
+        return surface
+    
+    #Removes all rendered texts
+    def clear(self):
+        self.surfaces.clear()
+
+#Shared text cache used by the level, the HUD, the log and the end screen
+TEXTS = TextCache()
+
+
+#-------------------------------------------------------------------------------
+#Helper text log that keeps a limited number of messages and merges repeated ones
+class MessageLog(object):
+    #ATTRIBUTES
+    entries   = None
+    repeatGap = None
+    
+    #Constructor Method
+    #Parameters: starting messages, maximum number of messages to keep,
+    #            longest time in ms between two copies of a message for them to be counted as one
+    def __init__(self, messages = [], capacity = 100, repeatGap = 5000):
+        
+        #Messages in format [text, times repeated, time of last repeat in ms, rendered line]
+        #The oldest messages are dropped once the log is full
+        self.entries   = deque(maxlen = capacity)
+        self.repeatGap = repeatGap
+        
+        for text in messages:
+            self.append(text)
+    
+    #Adds a message, or counts it again if it is the same as the newest message and was repeated soon after it
+    #Parameters: text of the message, time in ms (the time since pygame started if not given)
+    def append(self, text, time = None):
+        
+        if (time is None):
+            time = pygame.time.get_ticks()
+        
+        if (len(self.entries) > 0 and self.entries[-1][0] == text and time - self.entries[-1][2] <= self.repeatGap):
+            self.entries[-1][1] += 1
+            self.entries[-1][2] = time
+            self.entries[-1][3] = None
+        else:
+            self.entries.append([text, 1, time, None])
+    
+    #Returns the text of a message as it is shown in the log
+    #Parameters: message entry
+    def text(self, entry):
+        
+        #Repeated messages are shown once with the number of repeats
+        if (entry[1] > 1):
+            return entry[0] + " (x" + str(entry[1]) + ")"
+        return entry[0]
+    
+    #Returns the newest lines of the log, oldest first
+    #Parameters: number of lines
+    def lines(self, count):
+        
+        start = max(0, len(self.entries) - count)
+        return [self.text(self.entries[i]) for i in range(start, len(self.entries))]
+    
+    #Returns the rendered newest lines of the log, oldest first (each line is only rendered once)
+    #Parameters: font to render with, number of lines
+    def rendered(self, font, count):
+        
+        start = max(0, len(self.entries) - count)
+        lines = []
+        
+        for i in range(start, len(self.entries)):
+            entry = self.entries[i]
+            if (entry[3] is None):
+                entry[3] = TEXTS.render(font, self.text(entry), BLACK)
+            lines.append(entry[3])
+        
+        return lines
+    
+    #Returns the number of messages in the log
+    def __len__(self):
+        return len(self.entries)
+
+#Helper text log
+LOGLST = MessageLog(["Welcome to The Quest for the Golden Coins", "Press 1 for help text"])
+
+
+#-------------------------------------------------------------------------------
+#Returns an image of a platform cut from the top left corner of a shared texture
+#Parameters: path of the texture, dimensions of the platform
+def platformImage(path, dimensions):
+    
+    texture = ASSETS.texture(path, dimensions)
+    width   = min(dimensions[0], texture.get_width())
+    height  = min(dimensions[1], texture.get_height())
+    
+    #A subsurface shares its pixels with the texture, so no copy is made
+    view = texture.subsurface([0, 0, width, height])
+    
+    #Platforms bigger than the texture get their own surface (the rest stays black)
+    if (width < dimensions[0] or height < dimensions[1]):
+        image = pygame.Surface(dimensions)
+        image.blit(view, [0, 0])
+        return image
+    
+    return view
+    
+    
+#-------------------------------------------------------------------------------
+#Ends the game and displays the ending screen
+def displayEndScreen(screen, player, reason, time):
 
-        #Fade background music out
-        bgMusic.fadeout(500)
-        
         #Check the reason for ending the game
         if (reason == 'lose'):   
             #Colour the screen red
@@ -566,14 +2497,14 @@ def displayEndScreen(screen, player, reason, time):
             player.health = 0
             
             #Render text
-            msg = gameOverFont.render("Oh dear, you died!", True, WHITE)
+            msg = TEXTS.render(gameOverFont, "Oh dear, you died!", WHITE)
             
         elif (reason == 'time'):
             #Colour the screen orange
             screenColour = ORANGE
             
             #Render text
-            msg = gameOverFont.render("Looks like you're out of time!", True, WHITE)
+            msg = TEXTS.render(gameOverFont, "Looks like you're out of time!", WHITE)
             
             #Make the time  0 so player doesn't recieve time bonus
             time = 0
@@ -583,7 +2514,7 @@ def displayEndScreen(screen, player, reason, time):
             screenColour = PEAGREEN
             
             #Render text
-            msg = gameOverFont.render("Yay! You Won!", True, WHITE)
+            msg = TEXTS.render(gameOverFont, "Yay! You Won!", WHITE)
         
         #Display text and colour screen based on result of game
         screen.fill(screenColour)
@@ -595,637 +2526,1006 @@ def displayEndScreen(screen, player, reason, time):
             screen.blit(msg, [600, 350])
         
         #Render the text to display score, and give player bonus score for remaining time and/or health
-        score  = gameOverFont.render("Your score was: " + str(player.score+(time*50)+(player.health*75)), True, WHITE)
-        bonusT = gameOverFont.render("Time bonus: " + str(time*50), True, WHITE)
-        bonusH = gameOverFont.render("Health bonus: " + str(player.health*75), True, WHITE)
+        score  = TEXTS.render(gameOverFont, "Your score was: " + str(player.score+(time*50)+(player.health*75)), WHITE)
+        bonusT = TEXTS.render(gameOverFont, "Time bonus: " + str(time*50), WHITE)
+        bonusH = TEXTS.render(gameOverFont, "Health bonus: " + str(player.health*75), WHITE)
         screen.blit(score, [550, 450])
         screen.blit(bonusT, [550, 480])
         screen.blit(bonusH, [550, 510])
         
         
-##########################################################################################################################################
-'''
-MAIN PROGRAM
-'''
-##########################################################################################################################################
-if (__name__ == '__main__'):
+#-------------------------------------------------------------------------------
+#Loads levels from JSON files, and keeps a compiled binary copy of each level so it loads quickly next time
+class LevelLoader(object):
+    #ATTRIBUTES
+    cacheDirectory = None
+    cacheHits      = None
+    cacheMisses    = None
     
-    #Initialize pygame
-    pygame.init()
+    #Format of the compiled files: [magic, version, modification time of the JSON file, size of the level]
+    HEADER  = struct.Struct("<4sHdi")
+    MAGIC   = b"QGCL"
+    VERSION = 1
     
-    #Set time limit
-    time = 180
+    #Number of values in each row of a level's lists (the last value of platforms and obstacles is a type name)
+    ROWSIZES = OrderedDict([("platforms", 5), ("coins", 2), ("enemies", 2), ("obstacles", 5), ("text", 3)])
     
-    #Define fonts
-    font1        = pygame.font.SysFont("Consolas", 20, False, False)
-    font2        = pygame.font.SysFont("Consolas", 14, False, False)
-    gameOverFont = pygame.font.SysFont("Consolas", 30, False, False)
+    #Smallest and biggest whole number a level can hold (they are compiled as 32-bit numbers)
+    MINVALUE = -2 ** 31
+    MAXVALUE = 2 ** 31 - 1
     
-    #Reference and configure sounds
-    coinSound  = pygame.mixer.Sound("sounds/coin.ogg")
-    coinSound.set_volume(0.05)
-    playCoinSound = True
-    bgMusic    = pygame.mixer.Sound("sounds/bgMusic.ogg")
-    bgMusic.set_volume(0.25)
-    bgMusic.play()
-    jumpSound  = pygame.mixer.Sound("sounds/jump.ogg")
-    shootSound = pygame.mixer.Sound("sounds/shoot.ogg")
-    
-    #Set the width and height of the screen [width, height]
-    size   = (1366, 768)
-    screen = pygame.display.set_mode(size)
-    
-    #Set the screen title and window icon
-    pygame.display.set_caption("The Quest for the Golden Coins")
-    iconSurface = importImage('images/coin.png')
-    iconSurface.set_colorkey(BLACK)
-    pygame.display.set_icon(iconSurface)
-     
-    #Main Loop Control
-    done = False
-     
-    #Used to manage how fast the screen updates
-    clock = pygame.time.Clock()
+    #Constructor Method
+    #Parameters: folder for the compiled levels (next to each JSON file if not given)
+    def __init__(self, cacheDirectory = None):
+        
+        self.cacheDirectory = cacheDirectory
+        
+        #Count how often a compiled level could be used
+        self.cacheHits   = 0
+        self.cacheMisses = 0
     
-    #List of levels
-    allLevels = []
-
-    #Generate the levels
-    for i in range(2):
+    #Returns the information of a level, from the compiled file if it is newer than the JSON file
+    #Parameters: path of the JSON file
+    def load(self, path):
+        
+        mtime     = os.path.getmtime(path)
+        cachePath = self.cachePath(path)
+        
+        info = self.readCache(cachePath, mtime)
+        if (info is not None):
+            self.cacheHits += 1
+            return info
+        
+        #Read and check the JSON file, then compile it for the next time
+        self.cacheMisses += 1
+        with open(path) as levelFile:
+            info = json.load(levelFile)
+        self.validate(info, path)
+        info.setdefault("obstacles", [])
+        info.setdefault("text", [])
+        
+        try:
+            self.writeCache(info, cachePath, mtime)
+        except OSError:
+            pass
+        
+        return info
+    
+    #Returns a level built from a JSON file
+    #Parameters: path of the JSON file
+    def build(self, path):
+        return buildLevel(self.load(path))
+    
+    #Returns the path of the compiled copy of a level
+    #Parameters: path of the JSON file
+    def cachePath(self, path):
+        
+        directory = self.cacheDirectory
+        if (directory is None):
+            directory = os.path.join(os.path.dirname(path), "__cache__")
         
-        #Check which level should be generated next, then make the level information
-        #Specify first Level info
-        if (i == 0):
+        return os.path.join(directory, os.path.splitext(os.path.basename(path))[0] + ".lvl")
+    
+    #Checks that the information of a level has the right format, raises ValueError if it doesn't
+    #Parameters: level information, path of the file (for the error message)
+    def validate(self, info, path):
+        
+        if (not isinstance(info, dict)):
+            raise ValueError(path + ": a level must be a JSON object")
+        
+        if (not isinstance(info.get("maxWorldShift"), int)):
+            raise ValueError(path + ": maxWorldShift must be a whole number")
+        if (not self.MINVALUE <= info["maxWorldShift"] <= self.MAXVALUE):
+            raise ValueError(path + ": maxWorldShift is out of range, not " + repr(info["maxWorldShift"]))
+        
+        for key in self.ROWSIZES:
+            #Obstacles and text are optional
+            if (key not in info and key in ("obstacles", "text")):
+                continue
+            if (not isinstance(info.get(key), list)):
+                raise ValueError(path + ": " + key + " must be a list")
             
-            #Platform positions in format [x, y, width, height, type]
-            platformInfo = [ [  700, 728, 1200,  50,   'ground'], 
-                             [ 2450, 728,  550,  50,   'ground'], 
-                             [ 3625, 728, 1375,  50,   'ground'],
-                             [ 6500, 728, 1275,  50,   'ground'],
-                             [ 9510, 728,  490,  50,   'ground'],
-                             #----------------------------------
-                             [ -350,   0,  350, 768,     'wall'], 
-                             [    0, 268,  700, 500,   'ground'],
-                             [ 1000, 628,  300,  50, 'platform'], 
-                             [ 1450, 528,  300,  50, 'platform'],
-                             [ 1900, 528,  550, 240,   'ground'],
-                             #----------------------------------
-                             [ 3175, 628,  300,  50, 'platform'],
-                             [ 3650, 528, 1000,  50, 'platform'],
-                             #----------------------------------
-                             [ 5000, 678,  100, 100, 'platform'],
-                             [ 5100, 628,  100, 150, 'platform'],
-                             [ 5200, 578,  100, 200, 'platform'],
-                             [ 5300, 528,  100, 250, 'platform'],
-                             [ 5400, 478,  100, 300, 'platform'],
-                             [ 5500, 428,  100, 350, 'platform'],
-                             [ 5600, 378,  100, 400, 'platform'],
-                             #----------------------------------
-                             [ 5800, 378,  100, 400, 'platform'],
-                             [ 5900, 428,  100, 350, 'platform'],
-                             [ 6000, 478,  100, 300, 'platform'],
-                             [ 6100, 528,  100, 250, 'platform'],
-                             [ 6200, 578,  100, 200, 'platform'],
-                             [ 6300, 628,  100, 150, 'platform'],
-                             [ 6400, 678,  100, 100, 'platform'],
-                             #----------------------------------
-                             [ 6200, 378,  300,  50, 'platform'],
-                             [ 6600, 268,  300,  50, 'platform'],
-                             [ 7000, 628,  750,  20, 'platform'],
-                             [ 7925, 528,  200,  50, 'platform'],
-                             [ 8300, 428,  200,  50, 'platform'],
-                             [ 8675, 328,  200,  50, 'platform'],
-                             [ 8775, 678,  200,  50, 'platform'],
-                             #----------------------------------
-                             [ 9000, 678,  500, 100,   'ground'],
-                             [ 8990, 563,  310,  50, 'platform'],
-                             [ 9150, 448,  350,  50, 'platform'],
-                             [ 9300, 333,  100,  50, 'platform'],
-                             [ 9150, 303,  100,  50, 'platform'],
-                             [ 9000, 273,  100,  50, 'platform'],
-                             [ 9050, 158,  460,  50, 'platform'],
-                             #----------------------------------
-                             [ 8990, 158,   10, 405,     'wall'],
-                             [ 9500, 208,   10, 615,     'wall'],
-                             [ 9840,   0,  250, 600,     'wall'],
-                             [10000,   0, 1500, 768,     'wall'] ]
+            for row in info[key]:
+                if (not isinstance(row, list) or len(row) != self.ROWSIZES[key]):
+                    raise ValueError(path + ": every entry of " + key + " must be a list of " + str(self.ROWSIZES[key]) + " values, not " + repr(row))
+                
+                #Text is [text, x, y], everything else starts with whole numbers
+                if (key == "text"):
+                    numbers = row[1:]
+                    names   = row[:1]
+                elif (key in ("platforms", "obstacles")):
+                    numbers = row[:-1]
+                    names   = row[-1:]
+                else:
+                    numbers = row
+                    names   = []
+                
+                if (not all([isinstance(value, int) and not isinstance(value, bool) for value in numbers])):
+                    raise ValueError(path + ": positions and sizes in " + key + " must be whole numbers, not " + repr(row))
+                if (not all([self.MINVALUE <= value <= self.MAXVALUE for value in numbers])):
+                    raise ValueError(path + ": positions and sizes in " + key + " are out of range, not " + repr(row))
+                if (not all([isinstance(value, str) for value in names])):
+                    raise ValueError(path + ": types and texts in " + key + " must be strings, not " + repr(row))
+        
+        for row in info["platforms"]:
+            if (row[2] <= 0 or row[3] <= 0):
+                raise ValueError(path + ": platforms must have a positive size, not " + repr(row))
+    
+    #Writes the compiled copy of a level: a header, a table of strings, and an array of numbers for each list
+    #Parameters: level information, path of the compiled file, modification time of the JSON file
+    def writeCache(self, info, cachePath, mtime):
+        
+        #Every type name and text is stored once and replaced by its index in the table
+        strings = []
+        chunks  = [self.HEADER.pack(self.MAGIC, self.VERSION, mtime, info["maxWorldShift"])]
+        
+        for key in self.ROWSIZES:
+            numbers = array("i")
+            for row in info[key]:
+                for value in row:
+                    if (isinstance(value, str)):
+                        if (value not in strings):
+                            strings.append(value)
+                        value = strings.index(value)
+                    numbers.append(value)
+            chunks.append(struct.pack("<I", len(numbers)) + numbers.tobytes())
+        
+        table = "\0".join(strings).encode("utf-8")
+        chunks.insert(1, struct.pack("<I", len(table)) + table)
+        
+        #Write to a temporary file first, so a half written file is never read
+        os.makedirs(os.path.dirname(cachePath) or ".", exist_ok = True)
+        with open(cachePath + ".tmp", "wb") as cacheFile:
+            cacheFile.write(b"".join(chunks))
+        os.replace(cachePath + ".tmp", cachePath)
+    
+    #Reads the compiled copy of a level
+    #Parameters: path of the compiled file, modification time of the JSON file
+    #Returns: level information, or None if there is no up to date compiled copy
+    def readCache(self, cachePath, mtime):
+        
+        try:
+            with open(cachePath, "rb") as cacheFile:
+                data = cacheFile.read()
+            magic, version, cacheTime, maxWorldShift = self.HEADER.unpack_from(data, 0)
+        except (OSError, struct.error):
+            return None
+        
+        #The compiled copy is out of date if the JSON file changed since it was made
+        if (magic != self.MAGIC or version != self.VERSION or cacheTime != mtime):
+            return None
+        
+        #A truncated or damaged copy is ignored, so the level is read from the JSON file again
+        try:
+            return self.decode(data, maxWorldShift)
+        except (struct.error, IndexError, ValueError):
+            return None
+    
+    #Reads the strings and numbers of a compiled level, raises an error if they are damaged
+    #Parameters: contents of the compiled file, size of the level
+    #Returns: level information
+    def decode(self, data, maxWorldShift):
+        
+        offset = self.HEADER.size
+        length = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        strings = data[offset:offset + length].decode("utf-8").split("\0")
+        offset += length
+        
+        info = {"maxWorldShift": maxWorldShift}
+        for key in self.ROWSIZES:
+            count = struct.unpack_from("<I", data, offset)[0]
+            offset += 4
+            size = self.ROWSIZES[key]
+            numbers = array("i")
+            if (count % size != 0 or offset + count * numbers.itemsize > len(data)):
+                raise ValueError("the " + key + " of a compiled level are cut off")
+            numbers.frombytes(data[offset:offset + count * numbers.itemsize])
+            offset += count * numbers.itemsize
             
-            #Coin positions in format [x, y]                                      
-            coinPos = [ [  780, 118], 
-                        [  830, 148],
-                        [  870, 188],
-                        [ 1510, 675],
-                        [ 1565, 675],
-                        [ 1620, 675],
-                        [ 1310, 520], 
-                        [ 1350, 480],
-                        [ 1400, 450],
-                        #-----------
-                        [ 2075, 378],
-                        [ 2130, 378],
-                        [ 2185, 378],
-                        #-----------
-                        [ 3035, 620],
-                        [ 3075, 580],
-                        [ 3125, 550],
-                        [ 3510, 520],
-                        [ 3550, 480],
-                        [ 3600, 450],
-                        [ 4700, 450],
-                        [ 4750, 480],
-                        [ 4790, 520],
-                        #-----------
-                        [ 5675, 258],
-                        [ 5725, 228],
-                        [ 5775, 258],
-                        [ 6100, 370],
-                        [ 6140, 330],
-                        [ 6190, 300],
-                        [ 6500, 260],
-                        [ 6540, 220],
-                        [ 6590, 190],
-                        #-----------
-                        [ 7270, 678],
-                        [ 7320, 678],
-                        [ 7370, 678],
-                        [ 7420, 678],
-                        [ 7470, 678],
-                        #-----------
-                        [ 7785, 520],
-                        [ 7825, 480],
-                        [ 7875, 450],
-                        [ 8160, 420],
-                        [ 8200, 380],
-                        [ 8250, 350],
-                        [ 8535, 320],
-                        [ 8575, 280],
-                        [ 8625, 250],
-                        #-----------
-                        [ 8930, 398], 
-                        [ 8930, 448],
-                        [ 8930, 488],
-                        [ 9300, 508], 
-                        [ 9340, 528],
-                        [ 9380, 558],
-                        [ 9060, 440], 
-                        [ 9100, 400],
-                        [ 9150, 370],
-                        #-----------
-                        [ 9630,  78],
-                        [ 9680, 108],
-                        [ 9720, 148], 
-                        [ 9750, 198],
-                        [ 9770, 258] ]
-                        
-            #Enemy positions in format [x, y]
-            enemyPos = [ [ 2145, 468],
-                         [ 3300, 568],
-                         [ 4135, 468],
-                         [ 5035, 618],
-                         [ 5435, 418],
-                         [ 6335, 318],
-                         [ 6735, 208],
-                         [ 8760, 268],
-                         [ 9235, 618],
-                         [ 9085, 503],
-                         [ 9185, 503],
-                         [ 9285, 388],
-                         [ 9335, 273],
-                         [ 9185, 243] ]
+            #Cut the numbers back into rows, and put the strings back in
+            rows = [numbers[i:i + size].tolist() for i in range(0, count, size)]
+            for row in rows:
+                if (key == "text"):
+                    row[0] = self.string(strings, row[0])
+                elif (key in ("platforms", "obstacles")):
+                    row[-1] = self.string(strings, row[-1])
+            info[key] = rows
+        
+        if (offset != len(data)):
+            raise ValueError("a compiled level has data after its last list")
+        
+        return info
+    
+    #Returns a string of a compiled level's table, raises IndexError if there is no such string
+    #Parameters: table of strings, index in the table
+    def string(self, strings, index):
+        
+        if (index < 0 or index >= len(strings)):
+            raise IndexError("a compiled level refers to string " + str(index) + " of " + str(len(strings)))
+        return strings[index]
+
+#Shared level loader
+LEVELS = LevelLoader()
+
+
+#-------------------------------------------------------------------------------
+#Builds levels when the player reaches them and releases the levels that are finished
+class LevelManager(object):
+    #ATTRIBUTES
+    paths      = None
+    levels     = None
+    prefetched = None
+    threads    = None
+    
+    #Constructor Method
+    #Parameters: list of the level files, in order
+    def __init__(self, paths):
+        
+        self.paths = list(paths)
+        
+        #Levels that are built, keyed by index
+        self.levels = {}
+        
+        #Level information read ahead of time by a background thread, keyed by index
+        self.prefetched = {}
+        self.threads    = {}
+    
+    #Returns the number of levels
+    def __len__(self):
+        return len(self.paths)
+    
+    #Returns a level, building it first if it isn't built yet
+    #Parameters: index of the level
+    def __getitem__(self, levelNo):
+        
+        if (levelNo not in self.levels):
+            #Wait for the level's files to be read if that already started in the background
+            if (levelNo in self.threads):
+                self.threads.pop(levelNo).join()
             
-            #Obstacle positions in format [x, y, width, height, type]
-            obstacles = [ [ 3000, 738,  625,  40, 'lava'],
-                          [ 5700, 468,  100, 300, 'lava'],
-                          [ 7775, 743, 1225,  50, 'lava'] ]
+            if (levelNo in self.prefetched):
+                info = self.prefetched.pop(levelNo)
+            else:
+                info = LEVELS.load(self.paths[levelNo])
             
-            #Text in format ["Text", x, y]          
-            text = [ ["Press M for Help and Controls",  100,  75],
-                     [">>>> Level 2 >>>>"            , 9800, 625],
-                     [">>> This Way! >>>"            , 9800, 645],
-                     ["Mind that LAVA! >>"           , 2770, 650] ] 
+            self.levels[levelNo] = buildLevel(info)
         
-        #Specify second Level info
-        else:
-            platformInfo=[ [ -150,   0,  150,  768,     'wall'],
-                           [ 1950,   0, 1500,  768,     'wall'],
-                           [    0, 735,  600, 1950,   'ground'],
-                           [  600, 620,  200,   50, 'platform'],
-                           [  850, 550,  200,   50, 'platform'],
-                           [ 1100, 480,  200,   50, 'platform'],
-                           [ 1350, 410,  200,   50, 'platform'],
-                           [ 1600, 750,  350,   75,   'ground'] ]
-        
-            coinPos = [ [  598, 575],
-                        [  648, 575],
-                        [  698, 575],
-                        [  748, 575],
-                        [  846, 495],
-                        [  896, 495],
-                        [  946, 495],
-                        [  996, 495],
-                        [ 1100, 425],
-                        [ 1150, 425],
-                        [ 1200, 425],
-                        [ 1250, 425],
-                        [ 1606, 700],
-                        [ 1606, 645],
-                        [ 1606, 590],
-                        [ 1606, 535],
-                        [ 1651, 700],
-                        [ 1651, 645],
-                        [ 1651, 590],
-                        [ 1651, 535],
-                        [ 1701, 700],
-                        [ 1701, 645],
-                        [ 1701, 590],
-                        [ 1701, 535],
-                        [ 1751, 700],
-                        [ 1751, 645],
-                        [ 1751, 590],
-                        [ 1751, 535],
-                        [ 1801, 700],
-                        [ 1801, 645],
-                        [ 1801, 590],
-                        [ 1801, 535],
-                        [ 1851, 700],
-                        [ 1851, 645],
-                        [ 1851, 590],
-                        [ 1851, 535],
-                        [ 1901, 700],
-                        [ 1901, 645],
-                        [ 1901, 590],
-                        [ 1901, 535] ]
+        return self.levels[levelNo]
+    
+    #Starts reading a level's file in a background thread, so it is ready when the player gets there
+    #(Only the file is read in the background, the sprites are made by the main thread because pygame's surfaces aren't thread-safe)
+    #Parameters: index of the level
+    def prefetch(self, levelNo):
+        
+        if (levelNo >= len(self.paths) or levelNo in self.levels or levelNo in self.threads or levelNo in self.prefetched):
+            return
+        
+        self.threads[levelNo] = threading.Thread(target = self.read, args = (levelNo,))
+        self.threads[levelNo].daemon = True
+        self.threads[levelNo].start()
+    
+    #Reads a level's file (runs in the background thread)
+    #Parameters: index of the level
+    def read(self, levelNo):
+        self.prefetched[levelNo] = LEVELS.load(self.paths[levelNo])
+    
+    #Releases the sprites and surfaces of a finished level
+    #Parameters: index of the level
+    def unload(self, levelNo):
+        
+        if (levelNo in self.levels):
+            self.levels.pop(levelNo).unload()
+    
+    #Returns whether a level is built
+    #Parameters: index of the level
+    def isLoaded(self, levelNo):
+        return (levelNo in self.levels)
+
+
+#-------------------------------------------------------------------------------
+#Builds a level from the information of a level file
+#Parameters: level information (see LevelLoader)
+def buildLevel(info):
+    
+    level = Level()
+    level.generateLevel(info["platforms"], info["enemies"], info["coins"], info["text"], info["obstacles"])
+    level.maxWorldShift = info["maxWorldShift"]
+    
+    return level
+    
+    
+#-------------------------------------------------------------------------------
+#Recording of a play session: the random seed, and every input event tagged with the update it happened before
+#Replaying it through the same event handling gives exactly the same game
+class InputLog(object):
+    #ATTRIBUTES
+    seed   = None
+    ticks  = None
+    events = None
+    skips  = None
+    
+    #Format of the files: header [magic, version, seed, number of updates, number of events, number of skips],
+    #then the events [update, type, key] and the skips [update, seconds of game time skipped]
+    HEADER  = struct.Struct("<4sHQIII")
+    EVENT   = struct.Struct("<IBI")
+    SKIP    = struct.Struct("<Id")
+    MAGIC   = b"QGCR"
+    VERSION = 1
+    
+    #Event types that are recorded (the game only reacts to these), stored as their index
+    EVENTTYPES = [pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP]
+    
+    #Constructor Method
+    #Parameters: random seed of the session
+    def __init__(self, seed = 0):
+        
+        self.seed  = seed
+        self.ticks = 0
+        
+        #Lists of [update, type index, key] and [update, seconds]
+        self.events = []
+        self.skips  = []
+    
+    #Records the events handled before an update
+    #Parameters: number of the next update, list of events
+    def record(self, tick, events):
+        
+        for event in events:
+            if (event.type in self.EVENTTYPES):
+                self.events.append((tick, self.EVENTTYPES.index(event.type), getattr(event, "key", 0)))
+    
+    #Records game time that was counted without being simulated (when the game couldn't keep up)
+    #Parameters: number of the next update, seconds skipped
+    def skip(self, tick, seconds):
+        self.skips.append((tick, seconds))
+    
+    #Returns the recorded events as pygame events, keyed by the update they happened before
+    def eventsByTick(self):
+        
+        events = {}
+        for tick, typeIndex, key in self.events:
+            if (self.EVENTTYPES[typeIndex] == pygame.QUIT):
+                event = pygame.event.Event(pygame.QUIT)
+            else:
+                event = pygame.event.Event(self.EVENTTYPES[typeIndex], key = key)
+            events.setdefault(tick, []).append(event)
+        
+        return events
+    
+    #Saves the recording
+    #Parameters: path of the file
+    def save(self, path):
+        
+        chunks  = [self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.ticks, len(self.events), len(self.skips))]
+        chunks += [self.EVENT.pack(*event) for event in self.events]
+        chunks += [self.SKIP.pack(*skip) for skip in self.skips]
+        
+        with open(path, "wb") as logFile:
+            logFile.write(b"".join(chunks))
+    
+    #Loads a recording
+    #Parameters: path of the file
+    def load(self, path):
+        
+        with open(path, "rb") as logFile:
+            data = logFile.read()
+        
+        magic, version, self.seed, self.ticks, eventCount, skipCount = self.HEADER.unpack_from(data, 0)
+        if (magic != self.MAGIC or version != self.VERSION):
+            raise ValueError(path + ": not an input recording")
+        
+        offset = self.HEADER.size
+        self.events = [self.EVENT.unpack_from(data, offset + i * self.EVENT.size) for i in range(eventCount)]
+        offset += eventCount * self.EVENT.size
+        self.skips = [self.SKIP.unpack_from(data, offset + i * self.SKIP.size) for i in range(skipCount)]
+    
+    
+#-------------------------------------------------------------------------------
+#Class for the game, runs one frame at a time so it can also be run without a window
+class Game(object):
+    #ATTRIBUTES
+    screen          = None
+    clock           = None
+    renderer        = None
+    levels          = None
+    currentLevelNo  = None
+    player          = None
+    players         = None
+    time            = None
+    elapsed         = None
+    done            = None
+    dispHud         = None
+    dispLog         = None
+    playerWon       = None
+    playCoinSound   = None
+    recorder        = None
+    updates         = None
+    bindings        = None
+    releaseBindings = None
+    moveKeys        = None
+    held            = None
+    systems         = None
+    startX          = None
+    
+    #Constructor Method
+    #Parameters: whether to run without a window or sound, seed for the random numbers (optional),
+    #recording to add the inputs to (optional)
+    def __init__(self, headless = False, seed = None, recorder = None):
+        
+        #Use SDL's dummy drivers, so no window is opened and no sound is played
+        if (headless):
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
+        
+        #A recorded session needs a known seed, so it can be replayed
+        self.recorder = recorder
+        if (recorder is not None):
+            if (seed is None):
+                seed = Random().getrandbits(32)
+            recorder.seed = seed
+        
+        #Make the random numbers (e.g. enemy jump intervals) the same every run
+        if (seed is not None):
+            RNG.seed(seed)
+        
+        #Number of updates run so far
+        self.updates = 0
+        
+        #Initialize pygame
+        pygame.init()
+        
+        #Set time limit, and the game time that has passed (in seconds)
+        self.time    = TIMELIMIT
+        self.elapsed = 0.0
+        
+        #Define fonts
+        loadFonts()
+        
+        #Start the sound and the background music (a headless game has no sound)
+        self.playCoinSound = True
+        if (not headless and SOUNDS.start()):
+            SOUNDS.playMusic()
+        
+        #Set the width and height of the screen [width, height]
+        size        = (1366, 768)
+        self.screen = pygame.display.set_mode(size)
+        
+        #Set the screen title and window icon
+        pygame.display.set_caption("The Quest for the Golden Coins")
+        iconSurface = importImage('images/coin.png')
+        iconSurface.set_colorkey(BLACK)
+        pygame.display.set_icon(iconSurface)
+        
+        #Load the images shared by the sprites of every level
+        ASSETS.preload(["images/coin.png", "images/enemy.png", "images/player/defaultImage.png"], WHITE)
+        for name in ANIMATIONS:
+            ASSETS.clip(name)
+         
+        #Main Loop Control
+        self.done = False
+         
+        #Used to manage how fast the screen updates
+        self.clock = pygame.time.Clock()
+        
+        #Levels are generated when the player reaches them
+        self.levels = LevelManager(LEVELFILES)
+        
+        #Controls the index for the level list
+        self.currentLevelNo = 0
+        
+        #Create the player and set his current level
+        self.player = Player()
+        self.player.currentLevel = self.levels[self.currentLevelNo]
+        
+        #List of player (Pygame cannot draw individual sprite)
+        self.players = pygame.sprite.Group()
+        self.players.add(self.player)
+        
+        #Controls whether to display HUD and helper text
+        self.dispHud = True
+        self.dispLog = False
+        
+        #Controls how to end the game
+        self.playerWon = False
+        
+        #Commands of each key, the speed of each movement key, and the movement keys held down (in the order they were pressed)
+        self.bindings        = dict(KEYBINDINGS)
+        self.releaseBindings = dict(RELEASEBINDINGS)
+        self.moveKeys        = dict(MOVEKEYS)
+        self.held            = []
+        
+        #Parts of an update, run in this order every update (each is timed by the profiler under its name)
+        #(the state of the enemies and bullets the systems work on is in the component columns of the level's entity store)
+        self.systems = [("remember", self.rememberSystem), ("collisions", self.collisionSystem), ("scroll", self.scrollSystem),
+                        ("progress", self.progressSystem), ("animation", self.animationSystem), ("time", self.timeSystem),
+                        ("ai", self.aiSystem), ("update", self.physicsSystem)]
+        
+        #Only put the events the game handles on the event queue (expose events mean the window lost what was drawn on it)
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP, pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE])
+        
+        #Controls how frames are put on the screen (only changed regions, or full flips if DIRTYRECTS is False)
+        self.renderer = Renderer(self.screen, DIRTYRECTS)
+    
+    #Puts the player at the start of a level
+    #Parameters: index of the level
+    def startLevel(self, levelNo):
+        
+        #Release the level the player leaves, like finishing it does
+        if (levelNo != self.currentLevelNo):
+            self.levels.unload(self.currentLevelNo)
+        
+        self.currentLevelNo = levelNo
+        self.player.currentLevel = self.levels[levelNo]
+        self.player.rect.x = 150
+        self.player.rect.y = 150
+        self.player.prevPos = None
+    
+    #Runs one frame of the game with exactly one update (used for headless runs)
+    #Parameters: list of events that happened since the last frame
+    #Returns: whether the game is still running
+    def step(self, inputs):
+        
+        PROFILER.beginFrame()
+        with PROFILER.scope("events"):
+            self.handleEvents(inputs)
+        self.updateLogic()
+        self.render()
+        PROFILER.endFrame(self.spriteCounts())
+        
+        return not self.done
+    
+    #Runs the game until the window is closed
+    #The game is updated SIMRATE times per game second no matter how fast frames are drawn
+    def run(self):
+        
+        #Real time that still has to be simulated
+        accumulator = 0.0
+        previous    = perf_counter()
+        
+        #--------------------------- MAIN PROGRAM LOOP -----------------------------
+        while (not self.done):
+            
+            #Add the real time since the last frame
+            now          = perf_counter()
+            accumulator += now - previous
+            previous     = now
+            
+            PROFILER.beginFrame()
+            with PROFILER.scope("events"):
+                self.handleEvents(pygame.event.get(), pygame.key.get_pressed())
+            
+            #Run fixed size updates until the game has caught up, skipping drawing in between under load
+            steps = 0
+            while (accumulator >= SIMSTEP and steps < MAXSTEPS):
+                self.updateLogic()
+                accumulator -= SIMSTEP
+                steps += 1
+            
+            #If the game still can't catch up, give up on simulating the rest, but keep counting it for the time limit
+            if (accumulator >= SIMSTEP):
+                self.skip(accumulator - accumulator % SIMSTEP)
+                accumulator %= SIMSTEP
             
-            enemyPos = [ [  688, 560],
-                         [  934, 490],
-                         [ 1180, 420],
-                         [ 1438, 350] ]
-                         
-            obstacles = [ [600, 755, 1000, 75, 'lava'] ]  
-                       
-            text = [ ["WELCOME TO LEVEL 2! >>"     ,   25, 350],
-                     [">>>>> Touch the wall >>>>>>", 1650, 350],
-                     [">>>>>    TO WIN!!!   >>>>>>", 1650, 385] ]
+            #Draw between the last two updates if interpolation is on
+            if (INTERPOLATE):
+                self.render(accumulator / SIMSTEP)
+            else:
+                self.render()
+            
+            PROFILER.endFrame(self.spriteCounts())
             
-        #Generate the level
-        level = Level()
-        level.generateLevel(platformInfo, enemyPos, coinPos, text, obstacles)
-        allLevels.append(level)
+            #Limit the frame rate
+            self.clock.tick(FPSLIMIT)
         
-    #Set the size of each level
-    allLevels[0].maxWorldShift = 9970
-    allLevels[1].maxWorldShift = 1920
+        #Close the Window
+        pygame.quit()
     
-    #Controls the index for the level list
-    currentLevelNo = 0
-    
-    #Create the player and set his current level
-    player = Player()
-    player.currentLevel = allLevels[currentLevelNo]
+    #Counts game time for the time limit without simulating it
+    #Parameters: seconds of game time
+    def skip(self, seconds):
+        
+        if (self.recorder is not None):
+            self.recorder.skip(self.updates, seconds)
+        
+        if (self.isPlaying()):
+            self.elapsed += seconds
     
-    #List of player (Pygame cannot draw individual sprite)
-    players = pygame.sprite.Group()
-    players.add(player)
+    #Plays a recorded session again as fast as possible
+    #Parameters: recording, whether to draw the frames
+    def replay(self, log, render = False):
+        
+        events = log.eventsByTick()
+        skips  = {}
+        for tick, seconds in log.skips:
+            skips.setdefault(tick, []).append(seconds)
+        
+        #Everything happens in the same order as in the main loop: skipped time, then events, then the update
+        for tick in range(log.ticks):
+            for seconds in skips.get(tick, []):
+                self.skip(seconds)
+            self.handleEvents(events.get(tick, []))
+            self.updateLogic()
+            if (render):
+                self.render()
     
-    #Controls whether to display HUD and helper text
-    dispHud = True
-    dispLog = False
+    #Returns the number of live sprites in each sprite list of the current level
+    def spriteCounts(self):
+        
+        level = self.player.currentLevel
+        return OrderedDict([("platforms", len(level.platforms)), ("obstacles", len(level.obstacles)), ("coins", len(level.coins)),
+                            ("enemies", len(level.enemies)), ("bullets", len(level.playerBullets) + len(level.enemyBullets)), ("updated", len(level.dynamicSprites))])
     
-    #Controls how to end the game
-    playerWon = False
-    outOfTime = False
+    #Returns whether the game is still being played (not lost, won or out of time)
+    def isPlaying(self):
+        return (self.player.health > 0 and not self.playerWon and self.time > 0)
     
-    #--------------------------- MAIN PROGRAM LOOP -----------------------------
-    while (not done): 
+    #--------------------------- Event Processing --------------------------
+    #Parameters: list of events, state of every key (optional, read once per frame by the main loop)
+    def handleEvents(self, events, pressed = None):
         
-        #--------------------------- Event Processing --------------------------
-        for event in pygame.event.get():
+        for event in events:
             
             #Check if user presses close
             if (event.type == pygame.QUIT):
-              done = True
+                self.done = True
+            
+            #The window lost what was drawn on it (e.g. it was uncovered or restored), so the next frame redraws all of it
+            if (event.type == pygame.WINDOWEXPOSED or event.type == pygame.VIDEOEXPOSE):
+                self.renderer.invalidate()
              
             #Check if user presses a key
             if (event.type == pygame.KEYDOWN):
                 
-                #Display help text in helper text box if user presses 1
-                if (event.key == pygame.K_1):
-                    #Add to the helper text list
-                    LOGLST.append("Use arrow keys to move left/right.")
-                    LOGLST.append("Press SPACE to jump.")
-                    LOGLST.append("Press A to shoot left and D to shoot right.")
-                    LOGLST.append("Press M to toggle log.")
-                    LOGLST.append("Press N to toggle HUD.")
-                    LOGLST.append("Press 3 to remove coin sound.")
-                    
-                #Toggle coin sound on/off if user presses 3
-                if (event.key == pygame.K_3):
-                    if (playCoinSound == True):
-                        playCoinSound = False
-                        LOGLST.append("You toggled coin sound off.") #Add to the helper text list
-                    else:
-                        playCoinSound = True
-                        LOGLST.append("You toggled coin sound on.") #Add to the helper text list
-                        
-                #Player movement controls
-                if (event.key == pygame.K_LEFT): #Move left
-                    player.move(-6)
-                if (event.key == pygame.K_RIGHT): #Move right
-                    player.move(6)
-                if (event.key == pygame.K_SPACE): #Jump
-                    jumpSound.play()
-                    player.jump()
-                    
-                #Player shooting controls
-                if (event.key == pygame.K_a): #Shoot left
-                    player.shoot(-15)
-                    
-                    #Check if the player has ammo, if so play sound
-                    if (player.ammo > 0):
-                        shootSound.play()
-                    else:
-                        LOGLST.append("You've run out of bullets!") #Add to the helper text list
-                        
-                if (event.key == pygame.K_d): #Shoot right
-                    player.shoot(15)
-                    
-                    #Check if the player has ammo, if so play sound
-                    if (player.ammo > 0):
-                        shootSound.play()
-                    else:
-                        LOGLST.append("You've run out of bullets!") #Add to the helper text list
-                        
-                #Key to toggle HUD
-                if (event.key == pygame.K_n):
-                    if (dispHud == False):
-                        dispHud = True
-                    else:
-                        dispHud = False
-                        
-                #Key to toggle Helper Text Box
-                if (event.key == pygame.K_m):
-                    if (dispLog == False):
-                        dispLog = True
-                    else:
-                        dispLog = False
+                #Movement keys count while they are held, every other key runs the command bound to it
+                if (event.key in self.moveKeys):
+                    if (event.key not in self.held):
+                        self.held.append(event.key)
+                elif (event.key in self.bindings):
+                    getattr(self, self.bindings[event.key])()
                 
                 '''
                 ###Cheats for testing
                 
                 #Fly cheat 
                 if (event.key == pygame.K_RETURN):
-                    player.velocityY -= 10
+                    self.player.velocityY -= 10
                 
                 #Add health cheat 
                 if (event.key == pygame.K_l):
-                    player.health += 100
+                    self.player.health += 100
                     
                 #Time cheat
                 if (event.key == pygame.K_0):
-                    time += 60
+                    self.elapsed -= 60
                 if (event.key == pygame.K_9):
-                    time -= 60
+                    self.elapsed += 60
                     
                 #Add score cheat
                 if (event.key == pygame.K_8):
-                    player.score += 500
+                    self.player.score += 500
                 
                 #Refill ammo cheat
                 if (event.key == pygame.K_7):
-                    player.ammo = 20
+                    self.player.ammo = 20
                 '''
             
-            #Make player stop when he releases the movement keys            
+            #Check if user releases a key
             if (event.type == pygame.KEYUP):
-                #Set player velocity to 0 and reset sprite image to standing still image
-                if ((event.key  ==  pygame.K_RIGHT and player.velocityX > 0) or (event.key == pygame.K_LEFT and player.velocityX < 0)):
-                    player.move(0)
-                    player.image = player.playerImage
-                    
-                #Reset sprite image to standing still image
-                if (event.key == pygame.K_a or event.key == pygame.K_d):
-                    player.image = player.playerImage
-
-
-        #-------------------------- Game logic ---------------------------------
-        grossPosition = player.rect.x - player.currentLevel.worldShift
+                if (event.key in self.held):
+                    self.held.remove(event.key)
+                elif (event.key in self.releaseBindings):
+                    getattr(self, self.releaseBindings[event.key])()
         
-        #-----COLLISIONS:
+        #Correct the held movement keys with the state of the keyboard (e.g. a key released while the window was in the background)
+        if (pressed is not None):
+            events = events + self.pollKeys(pressed)
         
-        #COINS:
-        #Count the coins the player has collected
-        coinList = pygame.sprite.spritecollide(player, player.currentLevel.coins, True)
+        #Record the inputs for the next update
+        if (self.recorder is not None):
+            self.recorder.record(self.updates, events)
         
-        #Iterate through the coins the player collided with
-        for coin in coinList:
-            
-            #Give the player points and play sound
-            player.score += 100
-            if (playCoinSound == True):
-                coinSound.play()
-            
-            #Remove the collected coins from the sprite lists to prevent redrawing
-            player.currentLevel.allSprites.remove(coin)
-            player.currentLevel.coins.remove(coin)
-            
-            #Add 1 to the player's coins, and give him a small jump
-            player.coins  += 1
-            player.rect.y -= 10
+        self.steer()
+    
+    #Returns events for the movement keys whose state on the keyboard is different from the held keys, and applies them
+    #Parameters: state of every key
+    def pollKeys(self, pressed):
+        
+        changes = []
+        for key in self.moveKeys:
+            if (pressed[key] and key not in self.held):
+                self.held.append(key)
+                changes.append(pygame.event.Event(pygame.KEYDOWN, key = key))
+            elif (not pressed[key] and key in self.held):
+                self.held.remove(key)
+                changes.append(pygame.event.Event(pygame.KEYUP, key = key))
+        
+        return changes
+    
+    #Moves the player in the direction of the movement key pressed last that is still held
+    def steer(self):
         
-        #OBSTACLES:
-        #Count the deadly obstacles the player has collided with
-        obsCollided = pygame.sprite.spritecollide(player, player.currentLevel.obstacles, False)
+        velocity = 0
+        if (len(self.held) > 0):
+            velocity = self.moveKeys[self.held[-1]]
         
-        #Iterate through the collided obstacles
-        for obs in obsCollided:
-            
-            #Subtract 20 from health, and set player back before the obstacle
-            player.health -= 20
-            player.rect.x  = obs.rect.x - 200
-            player.rect.y  = obs.rect.y - 200
-            
-            #Add to the helper text box
-            LOGLST.append("You fell in lava! Be careful next time!") #Add to the helper text list
+        if (velocity != self.player.velocityX):
+            self.player.move(velocity)
+    
+    #Binds a key to a command (a method of the game) or to a movement speed, so controls can be remapped
+    #Parameters: key, name of the command or speed of the movement key (None removes the binding)
+    def bind(self, key, command):
+        
+        #A key does one thing, so drop what it did before (and stop moving if it was a held movement key)
+        self.bindings.pop(key, None)
+        self.moveKeys.pop(key, None)
+        if (key in self.held):
+            self.held.remove(key)
+            self.steer()
+        
+        if (isinstance(command, str)):
+            self.bindings[key] = command
+        elif (command is not None):
+            self.moveKeys[key] = command
+    
+    #--------------------------- Commands ----------------------------------
+    #Display help text in helper text box
+    def showHelp(self):
+        
+        #Add to the helper text list
+        LOGLST.append("Use arrow keys to move left/right.")
+        LOGLST.append("Press SPACE to jump.")
+        LOGLST.append("Press A to shoot left and D to shoot right.")
+        LOGLST.append("Press M to toggle log.")
+        LOGLST.append("Press N to toggle HUD.")
+        LOGLST.append("Press 3 to remove coin sound.")
+    
+    #Toggle coin sound on/off
+    def toggleCoinSound(self):
         
-        #ENEMIES:
-        #Count the enemies the player collided with
-        enemiesCollided = pygame.sprite.spritecollide(player, player.currentLevel.enemies, True)
+        if (self.playCoinSound == True):
+            self.playCoinSound = False
+            LOGLST.append("You toggled coin sound off.") #Add to the helper text list
+        else:
+            self.playCoinSound = True
+            LOGLST.append("You toggled coin sound on.") #Add to the helper text list
+    
+    #Make the player jump
+    def jump(self):
+        SOUNDS.play("jump")
+        self.player.jump()
+    
+    #Make the player shoot left
+    def shootLeft(self):
+        self.shoot(-15)
+    
+    #Make the player shoot right
+    def shootRight(self):
+        self.shoot(15)
+    
+    #Make the player shoot
+    #Parameters: velocity of the bullet
+    def shoot(self, bulletVelocity):
         
-        #Iterate through the enemies the player collided with, subtract health, and set player back 5px
-        for enem in enemiesCollided:
-            
-            player.rect.x -= 5
-            player.health -= 20
-            LOGLST.append("You ran into an enemy! How foolish!") #Add to the helper text list
-            
-        #BULLETS:
-        #Iterate through the player's bullets
-        for bull in player.currentLevel.playerBullets:
-            
-            #Count the bullets that hit an enemy
-            bulletsCollidedEnem = pygame.sprite.spritecollide(bull, player.currentLevel.enemies, True)
-            
-            #Iterate through the bullets that hit an enemy-----
-            for item in bulletsCollidedEnem:
-                
-                #Remove the bullet from the sprite lists, so that it won't be re-drawn
-                player.currentLevel.playerBullets.remove(bull)
-                player.currentLevel.allSprites.remove(bull)
-                
-                #Remove enemy and give player score
-                player.currentLevel.playerBullets.remove(item)
-                player.currentLevel.allSprites.remove(item)
-                player.score += 250
-                LOGLST.append("You shot an enemy!") #Add to the helper text list
-            
-            #Check if this bullet hit a platform
-            bulletsCollidedPlats = pygame.sprite.spritecollide(bull, player.currentLevel.platforms, False)
-            
-            #Remove the bullet when it hits a platform
-            for item in bulletsCollidedPlats:
-                player.currentLevel.playerBullets.remove(bull)
-                player.currentLevel.allSprites.remove(bull)
+        self.player.shoot(bulletVelocity)
+        
+        #Check if the player has ammo, if so play sound
+        if (self.player.ammo > 0):
+            SOUNDS.play("shoot")
+        else:
+            LOGLST.append("You've run out of bullets!") #Add to the helper text list
+    
+    #Toggle HUD
+    def toggleHud(self):
+        
+        if (self.dispHud == False):
+            self.dispHud = True
+        else:
+            self.dispHud = False
+    
+    #Toggle Helper Text Box
+    def toggleLog(self):
+        
+        if (self.dispLog == False):
+            self.dispLog = True
+        else:
+            self.dispLog = False
+    
+    #Toggle the performance overlay (profiling runs while it is shown)
+    def toggleOverlay(self):
+        PROFILER.overlay = not PROFILER.overlay
+        PROFILER.enabled = PROFILER.overlay
+    
+    #Save the profiled frames
+    def saveTrace(self):
+        PROFILER.export(TRACEFILE)
+        LOGLST.append("Saved " + str(len(PROFILER.trace)) + " profiled frames to " + TRACEFILE) #Add to the helper text list
+    
+    #-------------------------- Game logic ---------------------------------
+    #Updates the game by one fixed step of SIMSTEP seconds, running every system in order
+    def updateLogic(self):
+        
+        for name, system in self.systems:
+            with PROFILER.scope(name):
+                system()
+        
+        self.updates += 1
+    
+    #Remembers where everything was before this update
+    def rememberSystem(self):
+        
+        #Remember where everything was before this update, so drawing can interpolate
+        if (INTERPOLATE):
+            self.player.prevPos = self.player.rect.topleft
+            self.player.currentLevel.camera.prevX = self.player.currentLevel.camera.x
+            for sprite in self.player.currentLevel.dynamicSprites:
+                sprite.prevPos = sprite.rect.topleft
+        
+        #The player's position in the world (sprites are never shifted, only the camera is)
+        self.startX = self.player.rect.x
+    
+    #Resolves every collision of this frame and plays the coin sound for collected coins
+    def collisionSystem(self):
+        
+        if (resolveCollisions(self.player, self.player.currentLevel) > 0 and self.playCoinSound == True):
+            SOUNDS.play("coin")
+    
+    #Scrolls the level if the player has reached the left or right side of the screen
+    def scrollSystem(self):
+        
+        self.player.currentLevel.camera.follow(self.player)
+        
+        #Bring the parts of the level near the camera to life, and park the parts far away
+        self.player.currentLevel.updateChunks()
+    
+    #Moves the player on to the next level at the end of a level
+    def progressSystem(self):
         
-        #Iterate through all of the enemy bullets
-        for bull in player.currentLevel.enemyBullets:
-            
-            #Count the bullets that hit a platform
-            bulletsCollidedPlats = pygame.sprite.spritecollide(bull, player.currentLevel.platforms, False)
-            
-            #Delete all bullets that hit a platforms
-            for item in bulletsCollidedPlats:
-                
-                player.currentLevel.enemyBullets.remove(bull)
-                player.currentLevel.allSprites.remove(bull)
-            
-            #Count the enemy bullets that hit the player
-            bulletsCollidedPlayer = pygame.sprite.spritecollide(player, player.currentLevel.enemyBullets, False)
-            
-            #Iterate through each enemy bullet that hits the player
-            for bull in bulletsCollidedPlayer:
-                
-                #Remove the bullet from the sprite lists to prevent it from being re-drawn
-                #and subtract 5 health for each bullet
-                player.currentLevel.allSprites.remove(bull)
-                player.currentLevel.enemyBullets.remove(bull)
-                LOGLST.append("Oh no! An enemy shot you") #Add to the helper text list
-                player.health -= 5
-
-        #--- Level Management
-        #Check if player has reached the right side of the screen, if so scroll level
-        if (player.rect.x > 1000):
-            distancePast  = 1000 - player.rect.x
-            player.rect.x = 1000
-            player.currentLevel.scroll(distancePast)
-        
-        #Check if the player has reached the left side of the screen, if so scroll level
-        if (player.rect.x < 366):
-            distancePast  = 366 - player.rect.x
-            player.rect.x = 366
-            player.currentLevel.scroll(distancePast)
-            
         #Check if the player has reached the end of the level
-        if (grossPosition >= player.currentLevel.maxWorldShift):
+        if (self.startX >= self.player.currentLevel.maxWorldShift):
             
             #If the player is not on the last level, advance levels
-            if (currentLevelNo == 1):
-                playerWon = True
+            if (self.currentLevelNo == len(self.levels) - 1):
+                self.playerWon = True
             else:
-                #Change the variable that controls the level
-                currentLevelNo += 1
-                LOGLST.append("Player progressed to level 2!") #Add to the helper text list
+                #Change the variable that controls the level, and release the finished level
+                self.levels.unload(self.currentLevelNo)
+                self.currentLevelNo += 1
+                LOGLST.append("Player progressed to level " + str(self.currentLevelNo + 1) + "!") #Add to the helper text list
 
-                #Reset the player's position
-                player.rect.x = 150
-                player.rect.y = 150
+                #Reset the player's position (and draw the player there straight away, not on the way from the old level)
+                self.player.rect.x = 150
+                self.player.rect.y = 150
+                self.player.prevPos = None
 
                 #If the player's ammo is less than 10, give the player 10 bullets, else refill ammo to 20 
-                if (player.ammo < 10):
-                    player.ammo += 10
+                if (self.player.ammo < 10):
+                    self.player.ammo += 10
                     LOGLST.append("Player receives 10 bullets.") #Add to the helper text list
                 else:
-                    player.ammo = 20
+                    self.player.ammo = 20
                     LOGLST.append("Player's bullets are replenished.") #Add to the helper text list
                   
                 #Give player score and health  
-                player.score  += 2500
-                player.health += round((100-player.health)/3)
+                self.player.score  += 2500
+                self.player.health += round((100-self.player.health)/3)
     
-        #Set the player's current Level to the selected level
-        player.currentLevel = allLevels[currentLevelNo]
+        #Start reading the next level in the background during the last part of this level
+        elif (self.startX >= PREFETCHPOINT * self.player.currentLevel.maxWorldShift):
+            self.levels.prefetch(self.currentLevelNo + 1)
+    
+        #Set the player's current Level to the selected level (it is built when the player first gets there)
+        self.player.currentLevel = self.levels[self.currentLevelNo]
+    
+    #Walking animation, the frame shown depends on the time the player has been walking
+    def animationSystem(self):
+        self.player.walk(SIMSTEP)
+    
+    #Counts the game time, and takes the seconds that have passed off the time remaining
+    def timeSystem(self):
         
-        #--- More game logic
-        #Walking animation every 15 frames
-        if (player.currentFrame % 15 == 0):
-            player.walk()
-            
-        #Make enemies shoot every 30 frames 
-        if (player.currentFrame % 30 == 0):
-            
-            #Iterate through all the enemies in the level
-            for enemy in player.currentLevel.enemies:
-                enemy.shoot(player)
+        if (self.isPlaying()):
+            self.elapsed += SIMSTEP
+            self.time = max(0, TIMELIMIT - int(self.elapsed))
+    
+    #Wakes the enemies that can shoot or jump this frame
+    def aiSystem(self):
+        self.player.currentLevel.ai.run(self.player, self.player.currentFrame)
+    
+    #Updates the position of the player, and all of the moving sprites in the current Level
+    #(platforms, obstacles and coins never move, so they are skipped)
+    def physicsSystem(self):
+        self.player.update()
+        self.player.currentLevel.dynamicSprites.update()
+    
+    #--------------------------- Drawing code ------------------------------
+    #Parameters: how far the frame is between the last two updates, from 0 to 1 (only used when interpolating)
+    def render(self, alpha = 1.0):
         
-        #Every 60 frames (1 sec), subtract 1 from the time remaining
-        if (player.currentFrame % 60 == 0 and player.health > 0 and not playerWon and time > 0):
-            time -= 1
-                
-        #Make every enemy jump at their interval
-        for enemy in player.currentLevel.enemies:
-            
-            #Check if this frame is the interval between jumps for this enemy
-            if (player.currentFrame % enemy.jumpTime == 0):
-                enemy.jump(player)
-
-        #Update the position of the player, and all of the sprites in the current Level
-        player.update()
-        player.currentLevel.allSprites.update()
+        #Draw the level between the positions of the last two updates
+        self.player.currentLevel.alpha = alpha
         
-        #--------------------------- Drawing code ------------------------------
+        #Fade background music out once the game has ended
+        if (self.player.health <= 0 or self.playerWon or self.time <= 0):
+            SOUNDS.fadeoutMusic(500)
         
         #If the player dies, wins, or runs out of time, display the end screen
         #Otherwise, draw the level
-        if (player.health <= 0):
+        if (self.player.health <= 0):
             #Show end screen
-            displayEndScreen(screen, player, 'lose', time)
+            self.renderer.render(('lose', self.player.score, self.time), [], lambda: displayEndScreen(self.screen, self.player, 'lose', self.time))
             
             #Stop the player from moving
-            player.rect.x = 50
-            player.rect.y = 50
+            self.player.rect.x = 50
+            self.player.rect.y = 50
         
-        elif (playerWon):
+        elif (self.playerWon):
             #Show end screen
-            displayEndScreen(screen, player, 'won', time)
+            self.renderer.render(('won', self.player.score, self.player.health, self.time), [], lambda: displayEndScreen(self.screen, self.player, 'won', self.time))
             
             #Stop the player from moving
-            player.rect.x = 50
-            player.rect.y = 50
+            self.player.rect.x = 50
+            self.player.rect.y = 50
             
-        elif (time <= 0):
+        elif (self.time <= 0):
             #Show end screen
-            displayEndScreen(screen, player, 'time', time)
+            self.renderer.render(('time', self.player.score, self.player.health), [], lambda: displayEndScreen(self.screen, self.player, 'time', self.time))
             
             #Stop the player from moving
-            player.rect.x = 50
-            player.rect.y = 50
+            self.player.rect.x = 50
+            self.player.rect.y = 50
             
         else:
-            #Draw the level
-            player.currentLevel.draw(screen)
-            players.draw(screen)
-            displayHud(currentLevelNo + 1, player.health, player.coins, player.ammo, player.score, dispHud, dispLog, LOGLST)
+            #Everything on the screen that can change while the camera stands still
+            items = self.renderer.spriteItems(self.player.currentLevel, [self.player.currentLevel.allSprites, self.players])
+            if (self.dispHud == True):
+                items.append(((0, 0, 1366, 50), (self.currentLevelNo, self.player.health, self.player.coins, self.player.ammo, self.player.score, self.time)))
+            if (self.dispLog == True):
+                items.append(((965, 50, 400, 155), tuple(LOGLST.lines(LOGLINES))))
+            if (PROFILER.overlay):
+                items.append((PROFILERBOX, tuple(PROFILER.lines())))
             
-        #Console logging for debug purposes
-        #print ("Pos: "+str(player.rect)+'\nGross: '+str(grossPosition)+'\nScore: '+str(player.score)+'\nAmmo: '+str(player.ammo)+'\nLevel: '+str(currentLevelNo+1)+'\nGross Pos: '+str(grossPosition))
-        
-        #----------------------- Update the screen -----------------------------
+            #Draw the level, the whole screen changes when the camera moves
+            self.renderer.render((self.player.currentLevel, self.player.currentLevel.viewX(), self.dispHud, self.dispLog, PROFILER.overlay), items, self.drawLevel)
+    
+    #Draws the level, the player and the HUD
+    def drawLevel(self):
+        self.player.currentLevel.draw(self.screen)
+        self.player.currentLevel.drawGroup(self.screen, self.players)
+        displayHud(self.screen, self.currentLevelNo + 1, self.player.health, self.player.coins, self.player.ammo, self.player.score, self.time, self.dispHud, self.dispLog, LOGLST)
+        if (PROFILER.overlay):
+            displayProfiler(self.screen, PROFILER.lines())
         
-        #Update the screen
-        pygame.display.flip()
         
-        #Limit to 60 fps / 60 updates for second
-        clock.tick(60)
+##########################################################################################################################################
+'''
+MAIN PROGRAM
+'''
+##########################################################################################################################################
+if (__name__ == '__main__'):
     
-    #Close the Window
-    pygame.quit()
+    #Replay a recorded session without a window: python project.py --replay FILE
+    if (len(sys.argv) > 2 and sys.argv[1] == "--replay"):
+        log = InputLog()
+        log.load(sys.argv[2])
+        game = Game(headless = True, seed = log.seed)
+        
+        start = perf_counter()
+        game.replay(log)
+        print(str(log.ticks) + " updates in " + str(round(perf_counter() - start, 2)) + " s: level " + str(game.currentLevelNo + 1) +
+              ", x = " + str(game.player.rect.x) + ", score " + str(game.player.score) + ", health " + str(game.player.health))
+        pygame.quit()
     
+    #Create the game and run it until the window is closed (python project.py --record FILE also saves the inputs)
+    else:
+        recorder = None
+        if (len(sys.argv) > 2 and sys.argv[1] == "--record"):
+            recorder = InputLog()
+        
+        game = Game(recorder = recorder)
+        game.run()
+        
+        if (recorder is not None):
+            recorder.ticks = game.updates
+            recorder.save(sys.argv[2])
@@ -4,6 +4,7 @@
 #Date: 2016/01/19
 
 import unittest #Include the pyUnit unittest framework
+import os, json, shutil, tempfile
 import project
 from pygame import *
 
@@ -11,6 +12,18 @@ from pygame import *
 class projectTest(unittest.TestCase):
     ''' Main class for add testing; Can be added to a suite'''
 
+    # Module settings and shared objects that tests replace, put back after every test so no test changes the next one
+    GLOBALS = ["BULLETS", "VECTORPHYSICS", "VECTORROWS", "INTERPOLATE", "DIRTYRECTS"]
+
+    def setUp(self):
+        self.saved = dict([(name, getattr(project, name)) for name in self.GLOBALS])
+        self.profiling = project.PROFILER.enabled
+
+    def tearDown(self):
+        for name in self.saved:
+            setattr(project, name, self.saved[name])
+        project.PROFILER.enabled = self.profiling
+
     # Functions beginning with "test" will be ran as a unit test.
     def test_importImage(self):
         # Provide your test cases
@@ -23,6 +36,529 @@ class projectTest(unittest.TestCase):
         self.assertEqual(project.importImage("images/grassGround.png").get_size(), (10720, 1416))
         self.assertEqual(project.importImage("images/grassPlat.png").get_size(), (2904, 1416))
         
+    def test_assetRegistry(self):
+        # The same file and colorkey give back the same surface
+        assets = project.AssetRegistry()
+        coin = assets.get("images/coin.png", project.WHITE)
+        self.assertIs(assets.get("images/coin.png", project.WHITE), coin)
+        self.assertEqual((assets.hits, assets.misses), (1, 1))
+        self.assertEqual(coin.get_colorkey()[:3], project.WHITE)
+        self.assertEqual(assets.get("images/coss.png"), None)
+        # Evicting forces the next request to load from disk again
+        assets.evict(["images/coin.png"])
+        self.assertIsNot(assets.get("images/coin.png", project.WHITE), coin)
+        self.assertEqual(assets.misses, 3)
+        
+    def test_platformImage(self):
+        # Grass platforms are views of the shared texture, walls get their own surface
+        plat = project.Platform([100, 200], [300, 50], 'platform')
+        self.assertIs(plat.image.get_parent(), project.ASSETS.texture("images/grassPlat.png", [300, 50]))
+        self.assertEqual(plat.rect, (100, 200, 300, 50))
+        self.assertEqual(project.Platform([0, 0], [600, 1950], 'ground').image.get_size(), (600, 1950))
+        self.assertEqual(project.Platform([0, 0], [10, 10], 'wall').image.get_at((0, 0))[:3], project.BROWN)
+        
+    def test_camera(self):
+        # The camera scrolls to keep the player between x=366 and x=1000 on the screen
+        camera = project.Camera()
+        player = project.Player()
+        player.rect.x = 1500
+        camera.follow(player)
+        self.assertEqual(camera.x, 500)
+        self.assertEqual(player.rect.x - camera.x, 1000)
+        player.rect.x = 700
+        camera.follow(player)
+        self.assertEqual(camera.x, 334)
+        self.assertFalse(camera.isVisible(project.pygame.Rect(100, 0, 50, 50)))
+        
+    def test_spatialGrid(self):
+        # The grid finds the same platforms, in the same order, as spritecollide against the whole group
+        level = project.Level()
+        level.generateLevel([[0, 700, 1200, 50, 'ground'], [300, 500, 100, 50, 'platform'], [1150, 0, 300, 768, 'wall']], [], [], [])
+        for rect in [[290, 480, 30, 60], [1140, 690, 30, 60], [600, 100, 10, 10], [-50, 710, 30, 60]]:
+            sprite = project.pygame.sprite.Sprite()
+            sprite.rect = project.pygame.Rect(rect)
+            self.assertEqual(level.platformGrid.collide(sprite.rect), project.pygame.sprite.spritecollide(sprite, level.platforms, False))
+        
+    def test_textCache(self):
+        # Texts are rendered once and the least recently used text is evicted first
+        project.pygame.font.init()
+        font = project.pygame.font.SysFont("Consolas", 20, False, False)
+        texts = project.TextCache(2)
+        score = texts.render(font, 'Score: 000100', project.BLACK)
+        self.assertIs(texts.render(font, 'Score: 000100', project.BLACK), score)
+        texts.render(font, 'Ammo: 20/20', project.BLACK)
+        texts.render(font, 'Time: 180', project.BLACK)
+        self.assertIsNot(texts.render(font, 'Score: 000100', project.BLACK), score)
+        self.assertEqual((texts.hits, texts.misses), (1, 4))
+        
+    def test_messageLog(self):
+        # Repeated messages are merged and old messages are dropped when the log is full
+        log = project.MessageLog(["Welcome"], 3)
+        log.append("You fell in lava! Be careful next time!")
+        log.append("You fell in lava! Be careful next time!")
+        log.append("You fell in lava! Be careful next time!")
+        self.assertEqual(log.lines(10), ["Welcome", "You fell in lava! Be careful next time! (x3)"])
+        log.append("You shot an enemy!")
+        log.append("Oh no! An enemy shot you")
+        self.assertEqual(len(log), 3)
+        self.assertEqual(log.lines(2), ["You shot an enemy!", "Oh no! An enemy shot you"])
+        # A message repeated long after the last copy starts a new line
+        log.append("You shot an enemy!", 1000)
+        log.append("You shot an enemy!", 5000)
+        log.append("You shot an enemy!", 11000)
+        self.assertEqual(log.lines(2), ["You shot an enemy! (x2)", "You shot an enemy!"])
+        
+    def test_bulletPool(self):
+        # Bullets that fly off the screen go back to the pool and are reused for the next shot
+        project.BULLETS = project.BulletPool()
+        level = project.Level()
+        player = project.Player()
+        player.currentLevel = level
+        player.shoot(15)
+        bullet = level.playerBullets.sprites()[0]
+        self.assertEqual(project.BULLETS.live, 1)
+        for i in range(200):
+            level.allSprites.update()
+        self.assertEqual(len(level.allSprites), 0)
+        self.assertEqual((project.BULLETS.live, project.BULLETS.pooled), (0, 1))
+        player.shoot(-15)
+        self.assertIs(level.playerBullets.sprites()[0], bullet)
+        self.assertIs(bullet.image, project.BULLETS.image(project.PEAGREEN))
+        
+    def test_interpolationReset(self):
+        # A reused bullet and a player moved to a new level are drawn where they are, not between there and their old position
+        project.BULLETS = project.BulletPool()
+        level = project.Level()
+        level.alpha = 0.5
+        player = project.Player()
+        player.currentLevel = level
+        player.shoot(15)
+        bullet = level.playerBullets.sprites()[0]
+        bullet.prevPos = (5000, 150)
+        project.BULLETS.release(bullet)
+        player.shoot(15)
+        self.assertIs(level.playerBullets.sprites()[0], bullet)
+        self.assertEqual(level.screenRect(bullet).topleft, player.rect.topleft)
+        game = project.Game(headless = True, seed = 7)
+        game.player.prevPos = (9980, 600)
+        game.startLevel(1)
+        game.player.currentLevel.alpha = 0.5
+        self.assertEqual(game.player.currentLevel.screenRect(game.player).topleft, (150, 150))
+        self.assertFalse(game.levels.isLoaded(0))
+        
+    def test_resolveCollisions(self):
+        # Bullets are matched against enemies and the player once per frame, then removed
+        level = project.Level()
+        level.generateLevel([[0, 700, 2000, 50, 'ground']], [[600, 130]], [[150, 150]], [])
+        player = project.Player()
+        player.currentLevel = level
+        enemy = level.enemies.sprites()[0]
+        enemy.shoot(player)
+        player.rect.x = 500
+        player.shoot(15)
+        level.enemyBullets.sprites()[0].rect.topleft = player.rect.topleft
+        level.playerBullets.sprites()[0].rect.topleft = enemy.rect.topleft
+        self.assertEqual(project.resolveCollisions(player, level), 0)
+        self.assertEqual((player.health, player.score), (95, 250))
+        self.assertEqual((len(level.enemies), len(level.playerBullets), len(level.enemyBullets)), (0, 0, 0))
+        # An enemy with more health survives a hit
+        enemy = project.Enemy([600, 130], 60)
+        enemy.currentLevel = level
+        level.enemies.add(enemy)
+        level.dynamicSprites.add(enemy)
+        enemy.health = 2
+        player.shoot(15)
+        level.playerBullets.sprites()[0].rect.topleft = enemy.rect.topleft
+        project.resolveCollisions(player, level)
+        self.assertEqual((len(level.enemies), enemy.health, player.score, len(level.playerBullets)), (1, 1, 250, 0))
+        
+    def test_headlessGame(self):
+        # Two headless games with the same seed and inputs end up in the same state
+        states = []
+        for run in range(2):
+            game = project.Game(headless = True, seed = 7)
+            for frame in range(120):
+                inputs = []
+                if (frame == 1):
+                    inputs.append(project.pygame.event.Event(project.pygame.KEYDOWN, key = project.pygame.K_RIGHT))
+                if (frame % 30 == 0):
+                    inputs.append(project.pygame.event.Event(project.pygame.KEYDOWN, key = project.pygame.K_SPACE))
+                self.assertTrue(game.step(inputs))
+            states.append((tuple(game.player.rect), game.player.score, [enemy.jumpTime for enemy in game.levels[0].enemies]))
+        self.assertEqual(states[0], states[1])
+        self.assertFalse(game.step([project.pygame.event.Event(project.pygame.QUIT)]))
+        
+    def test_gameTime(self):
+        # The time limit counts game seconds (SIMRATE updates), not drawn frames
+        game = project.Game(headless = True, seed = 7)
+        for frame in range(project.SIMRATE + 1):
+            game.updateLogic()
+        self.assertEqual(game.time, project.TIMELIMIT - 1)
+        game.render()
+        game.render()
+        self.assertEqual(game.time, project.TIMELIMIT - 1)
+        
+    def test_fixedTimestep(self):
+        # The main loop runs SIMRATE updates per second whatever the frame rate, and time it can't simulate still counts
+        game = project.Game(headless = True, seed = 7)
+        project.INTERPOLATE = True
+        frameTimes = [3 * project.SIMSTEP + 1e-6] * 10 + [12 * project.SIMSTEP + 1e-6] * 5
+        clock = {"now": 0.0, "frames": 0, "updates": []}
+        class FakeClock(object):
+            def tick(self, fps):
+                clock["updates"].append(game.updates)
+                clock["now"] += frameTimes[clock["frames"]]
+                clock["frames"] += 1
+                game.done = (clock["frames"] == len(frameTimes))
+        timer = project.perf_counter
+        self.addCleanup(setattr, project, "perf_counter", timer)
+        project.perf_counter = lambda: clock["now"]
+        game.clock = FakeClock()
+        game.run()
+        # 3 updates per frame at 20 frames/sec, at most MAXSTEPS per frame at 5 frames/sec, with the rest of the time skipped
+        steps = [after - before for before, after in zip(clock["updates"], clock["updates"][1:])]
+        self.assertEqual(steps, [3] * 10 + [project.MAXSTEPS] * 4)
+        self.assertEqual(game.updates, 30 + 4 * project.MAXSTEPS)
+        self.assertAlmostEqual(game.elapsed, sum(frameTimes[:-1]), 4)
+        
+    def test_levelManager(self):
+        # Levels are built when they are reached, read ahead near the end of a level, and released when finished
+        game = project.Game(headless = True, seed = 7)
+        self.assertFalse(game.levels.isLoaded(1))
+        level1 = game.levels[0]
+        game.player.rect.topleft = (8000, 100)
+        game.step([])
+        self.assertIn(1, game.levels.threads)
+        game.player.rect.topleft = (9980, 100)
+        game.step([])
+        self.assertEqual(game.currentLevelNo, 1)
+        self.assertTrue(game.levels.isLoaded(1))
+        self.assertFalse(game.levels.isLoaded(0))
+        self.assertEqual(len(level1.allSprites), 0)
+        self.assertEqual(game.player.currentLevel.maxWorldShift, 1920)
+        
+    def test_chunks(self):
+        # Only the chunks near the camera have live sprites, and collected coins stay collected after parking
+        level = project.Level()
+        level.generateLevel([[0, 700, 10000, 50, 'ground']], [[100, 600], [8000, 600]], [[200, 600], [5000, 600]], [])
+        self.assertEqual((len(level.coins), len(level.enemies), len(level.platforms)), (1, 1, 1))
+        level.coins.sprites()[0].kill()
+        level.camera.x = 4500
+        level.updateChunks()
+        self.assertEqual([coin.rect.x for coin in level.coins], [5000])
+        self.assertEqual(len(level.enemies), 0)
+        self.assertEqual(len(level.platforms), 1)
+        level.camera.x = 0
+        level.updateChunks()
+        self.assertEqual((len(level.coins), len(level.enemies)), (0, 1))
+        
+    def test_backgroundLayer(self):
+        # Static geometry is drawn into a limited number of cached tiles, which are redrawn after invalidation
+        level = project.Level()
+        level.generateLevel([[0, 700, 6000, 50, 'ground'], [3000, 600, 100, 100, 'wall']], [], [], [])
+        screen = project.pygame.Surface([1366, 768])
+        for x in range(0, 5000, 500):
+            level.camera.x = x
+            level.background.draw(screen, level.camera.x)
+        self.assertLessEqual(len(level.background.tiles), level.background.maxTiles)
+        self.assertEqual(level.background.tile(2).get_at((3000 - 2048, 650))[:3], project.BROWN)
+        builds = level.background.builds
+        level.background.tile(2)
+        level.background.invalidate(project.pygame.Rect(3000, 600, 100, 100))
+        level.background.tile(2)
+        self.assertEqual(level.background.builds, builds + 1)
+        
+    def test_levelLoader(self):
+        # The compiled copy of a level gives back exactly what the JSON file says, until the JSON file changes
+        directory = tempfile.mkdtemp()
+        loader = project.LevelLoader(directory)
+        info = loader.load("levels/level1.json")
+        self.assertEqual(loader.load("levels/level1.json"), info)
+        self.assertEqual((loader.cacheHits, loader.cacheMisses), (1, 1))
+        self.assertEqual(info["platforms"][0], [700, 728, 1200, 50, 'ground'])
+        self.assertEqual(info["text"][3], ["Mind that LAVA! >>", 2770, 650])
+        path = os.path.join(directory, "broken.json")
+        with open(path, "w") as levelFile:
+            json.dump({"maxWorldShift": 100, "platforms": [[0, 0, 10, 'wall']], "coins": [], "enemies": []}, levelFile)
+        self.assertRaises(ValueError, loader.load, path)
+        with open(path, "w") as levelFile:
+            json.dump({"maxWorldShift": 100, "platforms": [[0, 0, 10, 10, 'wall']], "coins": [[5, 5]], "enemies": []}, levelFile)
+        os.utime(path, (1, 1))
+        self.assertEqual(loader.build(path).maxWorldShift, 100)
+        with open(path, "w") as levelFile:
+            json.dump({"maxWorldShift": 200, "platforms": [], "coins": [], "enemies": []}, levelFile)
+        os.utime(path, (2, 2))
+        self.assertEqual(loader.load(path)["maxWorldShift"], 200)
+        # A damaged compiled copy is ignored, and numbers too big to compile are rejected
+        cachePath = loader.cachePath("levels/level1.json")
+        with open(cachePath, "rb") as cacheFile:
+            data = cacheFile.read()
+        with open(cachePath, "wb") as cacheFile:
+            cacheFile.write(data[:-6])
+        self.assertEqual(loader.load("levels/level1.json"), info)
+        self.assertEqual(loader.load("levels/level1.json"), info)
+        self.assertEqual(loader.cacheMisses, 5)
+        with open(path, "w") as levelFile:
+            json.dump({"maxWorldShift": 200, "platforms": [], "coins": [[3000000000, 5]], "enemies": []}, levelFile)
+        os.utime(path, (3, 3))
+        self.assertRaises(ValueError, loader.load, path)
+        shutil.rmtree(directory)
+        
+    @unittest.skipIf(project.numpy is None, "numpy is not installed")
+    def test_entityStore(self):
+        # Enemies and bullets moved together in arrays, or one at a time through their rows, end up exactly where the sprite by sprite update puts them
+        states = []
+        for vectorPhysics, vectorRows in [(False, 64), (True, 64), (True, 0)]:
+            project.VECTORPHYSICS, project.VECTORROWS = vectorPhysics, vectorRows
+            project.RNG.seed(3)
+            level = project.Level()
+            level.generateLevel([[0, 700, 3000, 50, 'ground'], [400, 500, 200, 30, 'wall'], [420, 480, 100, 100, 'wall']],
+                                [[450, 440], [100, 300], [800, 640], [1200, 100]], [], [])
+            player = project.Player()
+            player.currentLevel = level
+            player.rect.topleft = (600, 640)
+            for frame in range(240):
+                level.ai.run(player, frame)
+                level.dynamicSprites.update()
+            states.append((sorted([tuple(enemy.rect) for enemy in level.enemies]), sorted([tuple(bullet.rect) for bullet in level.enemyBullets])))
+            level.unload()
+        self.assertEqual(states[0], states[1])
+        self.assertEqual(states[0], states[2])
+        self.assertEqual(len(states[1][1]), 2)
+        # An enemy in the store is a facade over its row, and gets its components back when it leaves
+        level = project.Level()
+        level.generateLevel([[0, 700, 3000, 50, 'ground']], [[100, 640]], [], [])
+        enemy = level.enemies.sprites()[0]
+        store = level.dynamicSprites
+        self.assertIs(enemy.store, store)
+        enemy.ammo, enemy.health = 7, 3
+        self.assertEqual((store.ammo[enemy.row], store.health[enemy.row], store.facing[enemy.row]), (7, 3, 1))
+        enemy.kill()
+        self.assertEqual((enemy.store, enemy.row, enemy.ammo, enemy.health), (None, None, 7, 3))
+        self.assertEqual(len(store.rows), 0)
+        # Only the platforms in the grid cells around the sprites are tested, however long the level is
+        level = project.Level()
+        store = project.EntityStore(level)
+        level.generateLevel([[0, 700, 300, 50, 'wall'], [90000, 700, 300, 50, 'wall']], [], [], [])
+        self.assertEqual(store.platformEdges(project.pygame.Rect(0, 600, 400, 200)).tolist(), [[0, 700, 300, 750]])
+        
+    def test_aiScheduler(self):
+        # Enemies are only woken at their jump frames, only enemies near the player shoot, and killed enemies are dropped
+        level = project.Level()
+        level.generateLevel([[0, 700, 3000, 50, 'ground']], [[100, 640], [1300, 640]], [], [])
+        enemies = sorted(level.enemies, key = lambda enemy: enemy.rect.x)
+        enemies[0].jumpTime, enemies[1].jumpTime = 50, 70
+        player = project.Player()
+        player.currentLevel = level
+        player.rect.topleft = (300, 640)
+        for frame in range(1, 141):
+            level.ai.run(player, frame)
+            level.dynamicSprites.update()
+        self.assertEqual(level.ai.woken, 4)
+        self.assertEqual(len(level.enemyBullets), 2)
+        self.assertEqual(level.ai.near(player, 500), [enemies[0]])
+        enemies[0].kill()
+        for frame in range(141, 211):
+            level.ai.run(player, frame)
+        self.assertEqual((level.ai.woken, level.ai.keys), (5, [1300]))
+        level.unload()
+        
+    def test_soundManager(self):
+        # Effects are loaded once when first played, missing files are skipped, and each effect cycles through its own channels
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+        sounds = project.SoundManager({"coin": "sounds/coin.ogg", "lost": "sounds/lost.ogg"}, {"coin": 0.05}, {"coin": 2})
+        sounds.play("coin")
+        self.assertEqual(sounds.sounds, {})
+        if (not sounds.start()):
+            self.skipTest("no audio device")
+        self.assertEqual(len(sounds.channels["coin"]) + len(sounds.channels["lost"]), 3)
+        for i in range(3):
+            sounds.play("coin")
+            sounds.play("lost")
+        self.assertEqual(round(sounds.get("coin").get_volume(), 2), 0.05)
+        self.assertIsNone(sounds.get("lost"))
+        self.assertEqual(sounds.nextVoice["coin"], 1)
+        self.assertIs(sounds.channels["coin"][0].get_sound(), sounds.get("coin"))
+        self.assertFalse(sounds.playMusic("sounds/bgMusic.ogg"))
+        sounds.setVolume("coin", 0.5)
+        self.assertEqual(sounds.get("coin").get_volume(), 0.5)
+        
+    def test_renderer(self):
+        # A frame drawn by updating only the changed regions matches the same frame drawn with a full flip
+        frames, pushed = [], []
+        for dirtyRects in [True, False]:
+            game = project.Game(headless = True, seed = 7)
+            game.renderer.dirtyRects = dirtyRects
+            for frame in range(90):
+                game.step([project.pygame.event.Event(project.pygame.KEYDOWN, key = project.pygame.K_SPACE)] if (frame % 30 == 0) else [])
+            frames.append(project.pygame.image.tostring(game.screen, "RGB"))
+            pushed.append(game.renderer.pixelsPushed)
+        self.assertEqual(frames[0], frames[1])
+        self.assertLess(pushed[0], pushed[1])
+        # Uncovering the window makes the next frame redraw all of it
+        game.renderer.dirtyRects = True
+        game.step([])
+        game.handleEvents([project.pygame.event.Event(project.pygame.WINDOWEXPOSED)])
+        self.assertTrue(game.renderer.redrawAll)
+        game.render()
+        self.assertEqual(game.renderer.pixelsPushed, 1366 * 768)
+        
+    def test_keyBindings(self):
+        # Keys run the command bound to them, and the movement key pressed last wins while both are held
+        game = project.Game(headless = True, seed = 7)
+        down = lambda key: project.pygame.event.Event(project.pygame.KEYDOWN, key = key)
+        up = lambda key: project.pygame.event.Event(project.pygame.KEYUP, key = key)
+        game.handleEvents([down(project.pygame.K_RIGHT), down(project.pygame.K_LEFT)])
+        self.assertEqual(game.player.velocityX, -6)
+        game.handleEvents([up(project.pygame.K_LEFT)])
+        self.assertEqual(game.player.velocityX, 6)
+        game.handleEvents([], {project.pygame.K_LEFT: False, project.pygame.K_RIGHT: False})
+        self.assertEqual(game.player.velocityX, 0)
+        game.bind(project.pygame.K_f, "shootRight")
+        game.bind(project.pygame.K_d, None)
+        game.handleEvents([down(project.pygame.K_f), down(project.pygame.K_d), down(project.pygame.K_n)])
+        self.assertEqual((game.player.ammo, game.dispHud), (19, False))
+        # Movement is remapped the same way, and the old movement key then does nothing
+        game.bind(project.pygame.K_LEFT, None)
+        game.bind(project.pygame.K_j, -6)
+        game.handleEvents([down(project.pygame.K_LEFT)])
+        self.assertEqual(game.player.velocityX, 0)
+        game.handleEvents([down(project.pygame.K_j)])
+        self.assertEqual(game.player.velocityX, -6)
+        game.bind(project.pygame.K_j, "jump")
+        self.assertEqual((game.player.velocityX, game.held), (0, []))
+        self.assertTrue(project.pygame.event.get_blocked(project.pygame.MOUSEMOTION))
+        self.assertFalse(project.pygame.event.get_blocked(project.pygame.KEYDOWN))
+        self.assertFalse(project.pygame.event.get_blocked(project.pygame.WINDOWEXPOSED))
+        
+    def test_inputLog(self):
+        # A recorded session saved to a file replays to exactly the same game
+        recorder = project.InputLog()
+        game = project.Game(headless = True, recorder = recorder)
+        for frame in range(300):
+            inputs = []
+            if (frame == 1):
+                inputs.append(project.pygame.event.Event(project.pygame.KEYDOWN, key = project.pygame.K_RIGHT))
+            if (frame % 45 == 0):
+                inputs.append(project.pygame.event.Event(project.pygame.KEYDOWN, key = project.pygame.K_SPACE))
+            if (frame == 200):
+                inputs.append(project.pygame.event.Event(project.pygame.KEYUP, key = project.pygame.K_RIGHT))
+                game.skip(2.5)
+            game.step(inputs)
+        recorder.ticks = game.updates
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "session.qgr")
+        recorder.save(path)
+        log = project.InputLog()
+        log.load(path)
+        self.assertEqual((log.seed, log.ticks, len(log.events), log.skips), (recorder.seed, 300, 9, [(200, 2.5)]))
+        replayed = project.Game(headless = True, seed = log.seed)
+        replayed.replay(log)
+        self.assertEqual((tuple(replayed.player.rect), replayed.player.score, replayed.elapsed), (tuple(game.player.rect), game.player.score, game.elapsed))
+        shutil.rmtree(directory)
+        
+    def test_systems(self):
+        # Updates run the systems in a fixed order (each profiled under its name), and bullets go to the shooter's side
+        game = project.Game(headless = True, seed = 7)
+        self.assertEqual([name for name, system in game.systems], ["remember", "collisions", "scroll", "progress", "animation", "time", "ai", "update"])
+        project.PROFILER.enabled = True
+        project.PROFILER.beginFrame()
+        game.updateLogic()
+        project.PROFILER.endFrame()
+        project.PROFILER.enabled = False
+        self.assertEqual([name for name in project.PROFILER.trace[-1] if (name not in ["frame", "total"])][:3], ["remember", "collisions.coins", "collisions.obstacles"])
+        self.assertIn("update", project.PROFILER.trace[-1])
+        enemy = project.Enemy([300, 150])
+        enemy.currentLevel = game.player.currentLevel
+        enemy.shoot(game.player)
+        self.assertEqual((len(enemy.currentLevel.enemyBullets), len(enemy.currentLevel.playerBullets)), (1, 0))
+        game.player.currentLevel.unload()
+        
+    def test_memoryReport(self):
+        # The report counts live and parked entities, and compact coins are smaller than plain sprites
+        level = project.Level()
+        level.generateLevel([[0, 700, 3000, 50, 'ground']], [[300, 640]], [[100, 600], [200, 600], [5000, 600]], [])
+        report = level.memoryReport()
+        self.assertEqual([report[kind][0] for kind in report], [2, 1, 0, 1, 4])
+        self.assertEqual(report["total"][2], sum([report[kind][2] for kind in ["coins", "enemies", "bullets", "parked"]]))
+        coin = level.coins.sprites()[0]
+        def plainCoin():
+            sprite = project.pygame.sprite.Sprite()
+            sprite.image, sprite.rect = coin.image, coin.rect.copy()
+            return sprite
+        self.assertLess(report["coins"][1], project.measureEntities(plainCoin, 2))
+        self.assertEqual(len(coin.groups()), 2)
+        coin.kill()
+        self.assertFalse(coin.alive())
+        # Slotted enemies join and leave sprite lists through every pygame call
+        self.assertTrue(project.COMPACTSPRITES)
+        enemy = level.enemies.sprites()[0]
+        level.enemies.remove(enemy)
+        self.assertNotIn(level.enemies, enemy.groups())
+        enemy.remove(level.allSprites)
+        self.assertEqual(enemy.groups(), [level.dynamicSprites])
+        enemy.add(level.enemies, level.enemies)
+        self.assertEqual((len(enemy.groups()), len(level.enemies)), (2, 1))
+        self.assertTrue(enemy.alive())
+        enemy.kill()
+        self.assertEqual((enemy.groups(), len(level.dynamicSprites)), ([], 0))
+        
+    def test_animationClip(self):
+        # Sprites share one clip, frames are picked by the time walked, and walking left shows the mirrored frames
+        clip = project.ASSETS.clip("playerWalk")
+        self.assertIs(project.ASSETS.clip("playerWalk"), clip)
+        self.assertEqual([frame.get_size() for frame in clip.frames], [(30, 60), (30, 60)])
+        self.assertIs(clip.frames[0].get_parent(), clip.sheet)
+        player, other = project.Player(), project.Player()
+        self.assertIs(player.walkClip, other.walkClip)
+        player.walk(1.0)
+        self.assertIs(player.image, player.idleClip.frames[0])
+        player.move(6)
+        player.walk(0.1)
+        self.assertIs(player.image, clip.frames[0])
+        player.walk(0.2)
+        self.assertIs(player.image, clip.frames[1])
+        player.move(-6)
+        player.walk(0.2)
+        self.assertIs(player.image, clip.flipped[0])
+        enemy = project.Enemy([300, 0])
+        enemy.shoot(player)
+        self.assertIs(enemy.image, enemy.clip.flipped[0])
+
+    def test_profiler(self):
+        # Profiled frames record the time of each named part and the sprite counts, and can be saved as CSV or JSON
+        profiler = project.Profiler(4)
+        with profiler.scope("draw"):
+            pass
+        self.assertEqual(profiler.scopes, {})
+        profiler.enabled = True
+        for frame in range(6):
+            profiler.beginFrame()
+            with profiler.scope("draw"):
+                pass
+            with profiler.scope("draw"):
+                pass
+            profiler.endFrame({"coins": frame})
+        self.assertEqual((len(profiler.window), len(profiler.trace)), (4, 6))
+        self.assertEqual(list(profiler.trace[-1].keys()), ["frame", "total", "draw", "coins"])
+        self.assertLessEqual(profiler.percentile(50), profiler.percentile(99))
+        directory = tempfile.mkdtemp()
+        profiler.export(os.path.join(directory, "trace.csv"))
+        with open(os.path.join(directory, "trace.csv")) as traceFile:
+            self.assertEqual(len(traceFile.readlines()), 7)
+        profiler.export(os.path.join(directory, "trace.json"))
+        with open(os.path.join(directory, "trace.json")) as traceFile:
+            self.assertEqual(json.load(traceFile)[5]["coins"], 5)
+        shutil.rmtree(directory)
+        # The trace keeps numbers in one array per column, drops the oldest frames when full, and leaves out parts a frame didn't have
+        trace = project.ProfileTrace(8)
+        for frame in range(20):
+            trace.append(project.OrderedDict([("frame", frame), ("total", 0.5)] + ([("draw", 0.25)] if (frame % 2 == 0) else [])))
+        self.assertEqual(len(trace), 8)
+        self.assertEqual([record["frame"] for record in trace], list(range(12, 20)))
+        self.assertEqual((trace[-1], trace[-2]), ({"frame": 19, "total": 0.5}, {"frame": 18, "total": 0.5, "draw": 0.25}))
+        self.assertEqual(trace.columns["draw"].typecode, "d")
+        
 
 #Main
 if __name__=='__main__':